@@ -1,67 +1,252 @@
 import os
 import json
+import hashlib
 import logging
+import fcntl
+import tempfile
+import threading
 from datetime import datetime, timedelta, UTC
-from flask import Flask, render_template, request, jsonify, Response
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 import csv
 import io
+import zlib
+from collections import Counter, defaultdict
+from itertools import islice
+
+import orjson
 
 from config import Config
 from models.database import db, Job, Company, PersonCount, HubSpotEnrichment, CompanyJobReference, CsvCompany, HubSpotCache, generate_query_fingerprint
 from sqlalchemy import text, or_
+from sqlalchemy.orm import load_only
 from services.prospeo_client import ProspeoClient
 from services.query_segmenter import QuerySegmenter
 from services.domain_utils import registrable_root_domain
-from jobs.market_sizing_job import start_job_async
+from jobs.market_sizing_job import start_job_async, build_aggregate_person_filters, COMPANY_ATTRIBUTE_FIELDS
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; types orjson can't encode fall back to Flask's default."""
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config.from_object(Config)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('market-sizing')
 db.init_app(app)
 
+# Additive schema changes applied at startup, declared so only missing ones are issued.
+# Columns to add: (table, column, column definition)
+STARTUP_ADDED_COLUMNS = [
+    # SDR count columns on HubSpot cache table (lowercase to match PostgreSQL)
+    ('hubspot_company_cache', 'aip_sdrs', 'INTEGER'),
+    ('hubspot_company_cache', 'override_sdrs', 'INTEGER'),
+    ('hubspot_company_cache', 'mixrank_sdrs', 'INTEGER'),
+    ('hubspot_company_cache', 'keyplay_sdrs', 'INTEGER'),
+    ('hubspot_company_cache', 'clay_sdrs', 'INTEGER'),
+    ('hubspot_company_cache', 'final_sdrs', 'INTEGER'),
+    # csv_company_id foreign keys for CSV uploads
+    ('person_counts', 'csv_company_id', 'INTEGER REFERENCES csv_companies(id)'),
+    ('hubspot_enrichments', 'csv_company_id', 'INTEGER REFERENCES csv_companies(id)'),
+    # data_source tracking for person counts (new vs existing reuse)
+    ('person_counts', 'data_source', "VARCHAR(20) DEFAULT 'api_call'"),
+]
+
+# Columns that must allow NULL: (table, column)
+STARTUP_NULLABLE_COLUMNS = [
+    # company_id is empty for CSV upload rows
+    ('person_counts', 'company_id'),
+    ('hubspot_enrichments', 'company_id'),
+    # hubspot_object_id is empty for domain-only CSV uploads
+    ('csv_companies', 'hubspot_object_id'),
+]
+
+# Indexes to create: (index name, table, columns)
+STARTUP_INDEXES = [
+    # Keyset pagination of job results
+    ('idx_companies_job_id_id', 'companies', 'job_id, id'),
+    # Job runner's load of a job's existing companies by Prospeo id
+    ('ix_companies_job_id_prospeo_company_id', 'companies', 'job_id, prospeo_company_id'),
+    # Preview's existing-job lookup
+    ('ix_jobs_fingerprint_status', 'jobs', 'query_fingerprint, status'),
+    # Per-job person count aggregation and HubSpot enrichment lookups
+    ('ix_person_counts_job_id_query_name', 'person_counts', 'job_id, query_name'),
+    ('ix_hubspot_enrichments_job_id', 'hubspot_enrichments', 'job_id'),
+    # CSV upload jobs stream their companies in id order
+    ('ix_csv_companies_job_id_id', 'csv_companies', 'job_id, id'),
+]
+
+
+def _pending_startup_migrations(conn):
+    """Diff the declared schema changes against the catalog and return the DDL still needed."""
+    tables = sorted({table for table, _, _ in STARTUP_ADDED_COLUMNS} | {table for table, _ in STARTUP_NULLABLE_COLUMNS})
+    columns = {
+        (row.table_name, row.column_name): row.is_nullable
+        for row in conn.execute(
+            text("""
+                SELECT table_name, column_name, is_nullable
+                FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = ANY(:tables)
+            """),
+            {"tables": tables}
+        )
+    }
+    indexes = {
+        row.indexname
+        for row in conn.execute(text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"))
+    }
+    
+    pending = []
+    for table, column, definition in STARTUP_ADDED_COLUMNS:
+        if (table, column) not in columns:
+            pending.append(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+    for table, column in STARTUP_NULLABLE_COLUMNS:
+        if columns.get((table, column)) == 'NO':
+            pending.append(f"ALTER TABLE {table} ALTER COLUMN {column} DROP NOT NULL")
+    for name, table, index_columns in STARTUP_INDEXES:
+        if name not in indexes:
+            pending.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({index_columns})")
+    return pending
+
+
+def _run_startup_migrations():
+    """Apply missing schema changes in one transaction; concurrent gunicorn workers serialize on a file lock."""
+    if db.engine.dialect.name != 'postgresql':
+        return  # SQLite dev databases are created fresh by db.create_all()
+    
+    lock_path = os.path.join(tempfile.gettempdir(), 'market_sizing_migrations.lock')
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with db.engine.connect() as conn:
+                try:
+                    # Catalog check and DDL share one transaction
+                    with conn.begin():
+                        pending = _pending_startup_migrations(conn)
+                        for ddl in pending:
+                            conn.execute(text(ddl))
+                    if pending:
+                        print(f"Applied {len(pending)} startup migrations")
+                except Exception as e:
+                    print(f"Migration note: {e}")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 # Basic database initialization with safe migrations
 try:
     with app.app_context():
         db.create_all()
-        
-        # Safe migrations - add new SDR fields to HubSpot cache and CSV upload support
-        from sqlalchemy import text
-        with db.engine.connect() as conn:
-            try:
-                # Add SDR count columns to HubSpot cache table (lowercase to match PostgreSQL)
-                conn.execute(text("ALTER TABLE hubspot_company_cache ADD COLUMN IF NOT EXISTS aip_sdrs INTEGER"))
-                conn.execute(text("ALTER TABLE hubspot_company_cache ADD COLUMN IF NOT EXISTS override_sdrs INTEGER"))
-                conn.execute(text("ALTER TABLE hubspot_company_cache ADD COLUMN IF NOT EXISTS mixrank_sdrs INTEGER"))
-                conn.execute(text("ALTER TABLE hubspot_company_cache ADD COLUMN IF NOT EXISTS keyplay_sdrs INTEGER"))
-                conn.execute(text("ALTER TABLE hubspot_company_cache ADD COLUMN IF NOT EXISTS clay_sdrs INTEGER"))
-                conn.execute(text("ALTER TABLE hubspot_company_cache ADD COLUMN IF NOT EXISTS final_sdrs INTEGER"))
-                
-                # CSV upload migrations
-                # Make company_id nullable for CSV uploads
-                conn.execute(text("ALTER TABLE person_counts ALTER COLUMN company_id DROP NOT NULL"))
-                conn.execute(text("ALTER TABLE hubspot_enrichments ALTER COLUMN company_id DROP NOT NULL"))
-                
-                # Add csv_company_id foreign keys
-                conn.execute(text("ALTER TABLE person_counts ADD COLUMN IF NOT EXISTS csv_company_id INTEGER REFERENCES csv_companies(id)"))
-                conn.execute(text("ALTER TABLE hubspot_enrichments ADD COLUMN IF NOT EXISTS csv_company_id INTEGER REFERENCES csv_companies(id)"))
-                
-                # Add data_source tracking for person counts (new vs existing reuse)
-                conn.execute(text("ALTER TABLE person_counts ADD COLUMN IF NOT EXISTS data_source VARCHAR(20) DEFAULT 'api_call'"))
-                
-                # Make hubspot_object_id nullable on csv_companies for domain-only uploads
-                conn.execute(text("ALTER TABLE csv_companies ALTER COLUMN hubspot_object_id DROP NOT NULL"))
-                
-                conn.commit()
-            except Exception as e:
-                print(f"Migration note: {e}")
+        _run_startup_migrations()
 except Exception as e:
     print(f"Database initialization error: {e}")
 
 client = ProspeoClient()
 segmenter = QuerySegmenter(client)
 
+# Active job runners by job id; runners remove themselves when their thread finishes
 running_jobs = {}
+running_jobs_lock = threading.Lock()
+
+# Rows fetched per round trip when streaming exports
+EXPORT_BATCH_SIZE = 500
+
+# Company columns in a detailed export, in order; each is also its CSV header
+DETAILED_EXPORT_COMPANY_COLUMNS = (
+    # Core fields
+    "prospeo_company_id", "name", "website", "domain",
+    
+    # Basic company information
+    "description", "description_seo", "description_ai", "company_type",
+    "industry", "employee_count", "employee_range", "founded", "logo_url",
+    
+    # Location details
+    "location_country", "location_city", "location_state", "location_country_code",
+    "location_raw_address",
+    
+    # Social media URLs
+    "linkedin_url", "twitter_url", "facebook_url", "crunchbase_url",
+    "instagram_url", "youtube_url",
+    
+    # Revenue information
+    "revenue_min", "revenue_max", "revenue_range_printed",
+    
+    # Attributes
+    "is_b2b", "has_demo", "has_free_trial", "has_downloadable",
+    "has_mobile_apps", "has_online_reviews", "has_pricing",
+    
+    # Classification
+    "linkedin_id",
+)
+
+# Boolean attribute columns, exported as-is so False isn't blanked
+DETAILED_EXPORT_FLAG_COLUMNS = frozenset(COMPANY_ATTRIBUTE_FIELDS)
+
+# Long text columns truncated to this many characters in detailed exports
+DETAILED_EXPORT_TRUNCATE = {"description": 500, "description_seo": 200, "description_ai": 200}
+
+# A completed Quick TAM run of the same query newer than this answers preview's aggregate counts
+PREVIEW_AGGREGATE_MAX_AGE = timedelta(hours=24)
+
+# Scalar Job columns that can be requested individually when polling job status
+JOB_POLL_FIELDS = {
+    'id', 'name', 'status', 'mode', 'total_companies', 'processed_companies',
+    'estimated_credits', 'actual_credits', 'error_message',
+    'companies_skipped', 'person_counts_skipped', 'hubspot_skipped'
+}
+
+
+class _Echo:
+    """File-like object that hands back whatever csv.writer writes, for streaming responses."""
+    def write(self, value):
+        return value
+
+
+def _job_etag(job):
+    """Validator over the Job columns that change while a job runs, for conditional polling."""
+    state = (
+        job.id, job.status, job.total_companies, job.processed_companies,
+        job.estimated_credits, job.actual_credits, job.companies_skipped,
+        job.person_counts_skipped, job.hubspot_skipped, job.error_message, job.completed_at
+    )
+    return hashlib.md5(repr(state).encode()).hexdigest()
+
+
+def _recent_quick_tam_aggregates(job):
+    """Return the job's stored Quick TAM counts if it completed within PREVIEW_AGGREGATE_MAX_AGE."""
+    if not job or job.mode != 'quick_tam' or job.status != 'completed':
+        return None
+    if job.aggregate_results is None or job.completed_at is None:
+        return None
+    
+    completed_at = job.completed_at
+    if completed_at.tzinfo is None:
+        completed_at = completed_at.replace(tzinfo=UTC)
+    if datetime.now(UTC) - completed_at > PREVIEW_AGGREGATE_MAX_AGE:
+        return None
+    return job.aggregate_results
+
+
+def _start_job_runner(job_id, mode=None):
+    """Start a background runner for the job and register it so /stop can reach it."""
+    # Holding the lock while starting means a fast-finishing runner can't unregister before it is registered
+    with running_jobs_lock:
+        running_jobs[job_id] = start_job_async(job_id, app, on_finish=_forget_job_runner, mode=mode)
+
+
+def _forget_job_runner(job_id):
+    with running_jobs_lock:
+        running_jobs.pop(job_id, None)
+
 
 def _normalize_company_filters(company_filters):
     """Apply location normalization to company search filters."""
@@ -93,16 +278,39 @@ def _normalize_company_filters(company_filters):
     return normalized_filters
 
 
+def _person_country(person):
+    """Country from a Prospeo person's nested location, or None."""
+    location = person.get("location")
+    return location.get("country") if isinstance(location, dict) else None
+
+
 @app.route("/")
 def index():
     jobs = Job.query.order_by(Job.created_at.desc()).limit(20).all()
     
+    # Count companies and active HubSpot enrichments for all detailed jobs in two grouped queries
+    detailed_job_ids = [job.id for job in jobs if job.mode == 'detailed']
+    company_counts = {}
+    hubspot_counts = {}
+    if detailed_job_ids:
+        company_counts = dict(
+            db.session.query(Company.job_id, db.func.count(Company.id))
+            .filter(Company.job_id.in_(detailed_job_ids))
+            .group_by(Company.job_id)
+            .all()
+        )
+        hubspot_counts = dict(
+            db.session.query(HubSpotEnrichment.job_id, db.func.count(HubSpotEnrichment.id))
+            .filter(HubSpotEnrichment.job_id.in_(detailed_job_ids), HubSpotEnrichment.is_active == True)
+            .group_by(HubSpotEnrichment.job_id)
+            .all()
+        )
+    
     # Add HubSpot enrichment statistics for each job
     for job in jobs:
         if job.mode == 'detailed':
-            # Count total companies and HubSpot enrichments for this job
-            total_companies = Company.query.filter_by(job_id=job.id).count()
-            hubspot_enrichments = HubSpotEnrichment.query.filter_by(job_id=job.id, is_active=True).count()
+            total_companies = company_counts.get(job.id, 0)
+            hubspot_enrichments = hubspot_counts.get(job.id, 0)
             
             job.hubspot_enriched_count = hubspot_enrichments
             job.hubspot_enrichment_percentage = round((hubspot_enrichments / total_companies * 100), 1) if total_companies > 0 else 0
@@ -150,6 +358,7 @@ def preview():
     data = request.json
     company_filters = data.get("company_filters", {})
     person_filters = data.get("person_filters", [])
+    include_countries = request.args.get("include_countries", "0") == "1"
     
     # Apply location normalization to company filters
     company_filters = _normalize_company_filters(company_filters)
@@ -157,16 +366,20 @@ def preview():
     # Generate fingerprint to check for existing data
     fingerprint = generate_query_fingerprint(company_filters, person_filters)
     
-    # Check for existing jobs with same query
-    existing_jobs = Job.query.filter_by(query_fingerprint=fingerprint).filter(
+    # Check for existing jobs with same query, loading only the columns preview reads
+    # (the filter JSON columns are already known from the request)
+    latest_job = Job.query.options(load_only(
+        Job.id, Job.name, Job.status, Job.mode, Job.total_companies,
+        Job.aggregate_results, Job.created_at, Job.completed_at
+    )).filter_by(query_fingerprint=fingerprint).filter(
         Job.status.in_(['completed', 'running'])
-    ).order_by(Job.created_at.desc()).all()
+    ).order_by(Job.created_at.desc()).first()
     
     existing_company_count = 0
     existing_job_info = None
-    if existing_jobs:
-        latest_job = existing_jobs[0]
-        existing_company_count = Company.query.filter_by(job_id=latest_job.id).count()
+    if latest_job:
+        # Company total is already recorded on the job row
+        existing_company_count = latest_job.total_companies or 0
         existing_job_info = {
             'job_id': latest_job.id,
             'job_name': latest_job.name,
@@ -175,9 +388,10 @@ def preview():
         }
     
     logger.info("=== PREVIEW: Company Search ===")
-    logger.info(json.dumps({"endpoint": "/search-company", "payload": {"page": 1, "filters": company_filters}}, indent=2))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(orjson.dumps({"endpoint": "/search-company", "payload": {"page": 1, "filters": company_filters}}, option=orjson.OPT_INDENT_2).decode())
     
-    response = client.search_companies(company_filters, page=1)
+    response = client.search_companies(company_filters, page=1, cached=True)
     
     if client.is_error(response):
         logger.warning("Company search failed: %s", client.get_error_code(response))
@@ -191,7 +405,7 @@ def preview():
     companies = client.extract_companies(response)
     
     sample_companies = []
-    for c in companies[:25]:
+    for c in islice(companies, 25):
         domain = c.get("domain") or c.get("website") or ""
         loc = c.get("location") if isinstance(c.get("location"), dict) else {}
         sample_companies.append({
@@ -206,42 +420,24 @@ def preview():
             "linkedin_url": c.get("linkedin_url"),
         })
     
+    # Person preview filters for the first company; the search itself runs in the
+    # aggregate batch below so it overlaps the other person searches
     person_preview = None
+    preview_filters = None
     if person_filters and companies:
         first_company = companies[0]
         domain = first_company.get("domain") or first_company.get("website") or ""
         root = registrable_root_domain(domain)
         
-        if root and person_filters:
+        if root:
             first_person_config = person_filters[0]
-            p_filters = dict(first_person_config.get("filters", {}))
-            
-            if "company" not in p_filters:
-                p_filters["company"] = {}
-            if "websites" not in p_filters["company"]:
-                p_filters["company"]["websites"] = {"include": [], "exclude": []}
-            p_filters["company"]["websites"]["include"] = [root]
-            
-            p_response = client.search_people(p_filters, page=1)
+            preview_filters = dict(first_person_config.get("filters", {}))
             
-            if not client.is_error(p_response):
-                p_pagination = client.get_pagination(p_response)
-                people = client.extract_people(p_response)
-                
-                sample_people = []
-                for p in people[:5]:
-                    sample_people.append({
-                        "name": p.get("full_name") or f"{p.get('first_name', '')} {p.get('last_name', '')}".strip(),
-                        "title": p.get("job_title") or p.get("title"),
-                        "seniority": p.get("seniority")
-                    })
-                
-                person_preview = {
-                    "query_name": first_person_config.get("name", "Person Query"),
-                    "company_name": first_company.get("name"),
-                    "total_count": p_pagination["total_count"],
-                    "sample_people": sample_people
-                }
+            if "company" not in preview_filters:
+                preview_filters["company"] = {}
+            if "websites" not in preview_filters["company"]:
+                preview_filters["company"]["websites"] = {"include": [], "exclude": []}
+            preview_filters["company"]["websites"]["include"] = [root]
     
     total_companies = pagination["total_count"]
     company_pages = (total_companies + 24) // 25
@@ -254,49 +450,70 @@ def preview():
     # Check if over 25k limit
     exceeds_limit = total_companies > 25000
     
-    # Aggregate person counts (Quick TAM mode)
-    aggregate_person_counts = {}
-    for person_config in person_filters:
-        query_name = person_config.get("name", "Unnamed Query")
-        p_filters = dict(person_config.get("filters", {}))
-        
-        # Merge company filters into person search (valid per Prospeo docs)
-        p_filters.update(company_filters)
-        
-        # Prospeo rejects include+exclude simultaneously on person_department
-        dept = p_filters.get("person_department")
-        if isinstance(dept, dict) and dept.get("include") and dept.get("exclude"):
-            p_filters["person_department"] = {"include": dept["include"]}
-        
-        logger.info("=== PREVIEW: Person Search [%s] ===", query_name)
-        logger.info(json.dumps({"endpoint": "/search-person", "payload": {"page": 1, "filters": p_filters}}, indent=2))
-        
-        p_response = client.search_people(p_filters, page=1)
-        
+    # Aggregate person counts (Quick TAM mode); a recent Quick TAM run of the same
+    # fingerprint already has them, unless the caller wants the sample country breakdown
+    stored_aggregates = None if include_countries else _recent_quick_tam_aggregates(latest_job)
+    aggregate_person_counts = dict(stored_aggregates) if stored_aggregates is not None else {}
+    person_searches = []
+    if stored_aggregates is None:
+        for person_config in person_filters:
+            query_name = person_config.get("name", "Unnamed Query")
+            p_filters = build_aggregate_person_filters(person_config, company_filters)
+            
+            logger.info("=== PREVIEW: Person Search [%s] ===", query_name)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(orjson.dumps({"endpoint": "/search-person", "payload": {"page": 1, "filters": p_filters}}, option=orjson.OPT_INDENT_2).decode())
+            person_searches.append((query_name, p_filters))
+    
+    # Independent searches run concurrently through the client's shared rate limiter
+    batch_filters = [p_filters for _, p_filters in person_searches]
+    if preview_filters is not None:
+        batch_filters.append(preview_filters)
+    p_responses = client.search_people_many(batch_filters, cached=True)
+    
+    if preview_filters is not None:
+        p_response = p_responses.pop()
+        if not client.is_error(p_response):
+            p_pagination = client.get_pagination(p_response)
+            people = client.extract_people(p_response)
+            
+            sample_people = []
+            for p in islice(people, 5):
+                sample_people.append({
+                    "name": p.get("full_name") or f"{p.get('first_name', '')} {p.get('last_name', '')}".strip(),
+                    "title": p.get("job_title") or p.get("title"),
+                    "seniority": p.get("seniority")
+                })
+            
+            person_preview = {
+                "query_name": first_person_config.get("name", "Person Query"),
+                "company_name": first_company.get("name"),
+                "total_count": p_pagination["total_count"],
+                "sample_people": sample_people
+            }
+    
+    for (query_name, _), p_response in zip(person_searches, p_responses):
         # Log the raw response for debugging
         logger.info("=== PREVIEW: Person Search [%s] RESPONSE ===", query_name)
-        logger.info(json.dumps({
-            "http_status": p_response.get("_http_status"),
-            "error": p_response.get("error"),
-            "error_code": p_response.get("error_code"),
-            "filter_error": p_response.get("filter_error"),
-            "pagination": p_response.get("pagination"),
-            "result_count": len(p_response.get("results") or [])
-        }, indent=2))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(orjson.dumps({
+                "http_status": p_response.get("_http_status"),
+                "error": p_response.get("error"),
+                "error_code": p_response.get("error_code"),
+                "filter_error": p_response.get("filter_error"),
+                "pagination": p_response.get("pagination"),
+                "result_count": len(p_response.get("results") or [])
+            }, option=orjson.OPT_INDENT_2).decode())
         
         if not client.is_error(p_response):
             p_pagination = client.get_pagination(p_response)
             aggregate_person_counts[query_name] = p_pagination["total_count"]
             
-            # Extract country breakdown from results
-            people = client.extract_people(p_response)
-            country_counts = {}
-            for person in people:
-                if isinstance(person, dict):
-                    country = person.get("location", {}).get("country") if isinstance(person.get("location"), dict) else None
-                    if country:
-                        country_counts[country] = country_counts.get(country, 0) + 1
-            aggregate_person_counts[f"{query_name}_sample_countries"] = country_counts
+            # Sample country breakdown is opt-in; the UI does not display it
+            if include_countries:
+                people = client.extract_people(p_response)
+                country_counts = Counter(filter(None, map(_person_country, people)))
+                aggregate_person_counts[f"{query_name}_sample_countries"] = dict(country_counts)
         else:
             aggregate_person_counts[query_name] = 0
     
@@ -373,106 +590,42 @@ def create_job():
     db.session.add(job)
     db.session.commit()
     
-    # Quick TAM mode runs synchronously (very fast)
-    if mode == "quick_tam":
-        run_quick_tam_job(job)
-        return jsonify(job.to_dict()), 201
-    
-    # Detailed mode runs async
-    job_runner = start_job_async(job.id, app)
-    running_jobs[job.id] = job_runner
-    
-    return jsonify(job.to_dict()), 201
-
-
-def run_quick_tam_job(job):
-    """Run Quick TAM job synchronously - just aggregate counts."""
-    job.status = 'running'
-    job.started_at = datetime.now(UTC)
-    db.session.commit()
-    
-    try:
-        # Get company count
-        logger.info("=== JOB %d: Company Search ===", job.id)
-        logger.info(json.dumps({"endpoint": "/search-company", "payload": {"page": 1, "filters": job.company_filters}}, indent=2))
-        
-        response = client.search_companies(job.company_filters, page=1)
-        
-        if client.is_error(response):
-            job.status = 'failed'
-            job.error_message = f"Company search failed: {client.get_error_code(response)}"
-            job.completed_at = datetime.now(UTC)
-            db.session.commit()
-            return
-        
-        pagination = client.get_pagination(response)
-        job.total_companies = pagination["total_count"]
-        credits_used = 1
-        
-        # Get aggregate person counts
-        aggregate_results = {}
-        for person_config in (job.person_filters or []):
-            query_name = person_config.get("name", "Unnamed Query")
-            p_filters = dict(person_config.get("filters", {}))
-            
-            # Merge company filters into person search (valid per Prospeo docs)
-            p_filters.update(job.company_filters)
-            
-            # Prospeo rejects include+exclude simultaneously on person_department
-            dept = p_filters.get("person_department")
-            if isinstance(dept, dict) and dept.get("include") and dept.get("exclude"):
-                p_filters["person_department"] = {"include": dept["include"]}
-            
-            logger.info("=== JOB %d: Person Search [%s] ===", job.id, query_name)
-            logger.info(json.dumps({"endpoint": "/search-person", "payload": {"page": 1, "filters": p_filters}}, indent=2))
-            
-            p_response = client.search_people(p_filters, page=1)
-            credits_used += 1
-            
-            # Log response for debugging
-            logger.info("=== JOB %d: Person Search [%s] RESPONSE ===", job.id, query_name)
-            logger.info(json.dumps({
-                "http_status": p_response.get("_http_status"),
-                "error": p_response.get("error"),
-                "error_code": p_response.get("error_code"),
-                "filter_error": p_response.get("filter_error"),
-                "pagination": p_response.get("pagination"),
-                "result_count": len(p_response.get("results") or [])
-            }, indent=2))
-            
-            if not client.is_error(p_response):
-                p_pagination = client.get_pagination(p_response)
-                aggregate_results[query_name] = p_pagination["total_count"]
-            else:
-                logger.warning("Person search failed for [%s]: %s", query_name, client.get_error_code(p_response))
-                aggregate_results[query_name] = 0
-        
-        job.aggregate_results = aggregate_results
-        job.actual_credits = credits_used
-        job.status = 'completed'
-        job.completed_at = datetime.now(UTC)
-        
-    except Exception as e:
-        job.status = 'failed'
-        job.error_message = str(e)
-        job.completed_at = datetime.now(UTC)
+    # All modes run on a background thread; clients poll /api/jobs/<id> for completion
+    _start_job_runner(job.id, mode)
     
-    db.session.commit()
+    # Accepted, not finished: the job resource to poll is in Location
+    return jsonify(job.to_dict()), 202, {"Location": f"/api/jobs/{job.id}"}
 
 
 @app.route("/api/jobs/<int:job_id>")
 def get_job(job_id):
+    # Pollers can ask for ?fields=status,processed_companies,... to skip loading the JSON filter columns
+    fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip() in JOB_POLL_FIELDS]
+    if fields:
+        row = Job.query.with_entities(*(getattr(Job, f) for f in fields)).filter_by(id=job_id).first_or_404()
+        return jsonify(dict(zip(fields, row)))
+    
     job = Job.query.get_or_404(job_id)
-    return jsonify(job.to_dict())
+    
+    # Repeat polls of an unchanged job get a bodyless 304 instead of a re-serialized job
+    etag = _job_etag(job)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(job.to_dict())
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @app.route("/api/jobs/<int:job_id>/stop", methods=["POST"])
 def stop_job(job_id):
     job = Job.query.get_or_404(job_id)
     
-    if job_id in running_jobs:
-        running_jobs[job_id].stop()
-        del running_jobs[job_id]
+    with running_jobs_lock:
+        job_runner = running_jobs.pop(job_id, None)
+    if job_runner:
+        job_runner.stop()
     
     job.status = "stopped"
     job.completed_at = datetime.now(UTC)
@@ -487,46 +640,88 @@ def get_job_results(job_id):
     
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 50, type=int)
+    after_id = request.args.get("after_id", type=int)
+    
+    if job.mode == 'quick_tam':
+        # Quick TAM keeps only its aggregate counts on the job row; it has no company
+        # rows, person counts or references, so none of those tables are queried
+        pagination = {"page": page, "per_page": per_page, "total": 0, "pages": 0}
+        if after_id is not None:
+            pagination = {"after_id": after_id, "per_page": per_page, "total": 0, "pages": 0, "next_cursor": None}
+        return _job_results_response(job, [], pagination, job.processed_companies, job.aggregate_results or {}, 0, 0)
     
     # Get companies: both directly owned AND linked via CompanyJobReference (deduplication)
     referenced_ids = db.session.query(CompanyJobReference.company_id).filter_by(job_id=job_id)
-    companies = Company.query.filter(
+    companies_query = Company.query.filter(
         or_(
             Company.job_id == job_id,
             Company.id.in_(referenced_ids)
         )
-    ).paginate(page=page, per_page=per_page, error_out=False)
+    )
+    # A plain COUNT of the job's company ids (no ORDER BY or subquery), served by
+    # the job_id indexes; processed_companies is a progress counter, not the row count
+    total = companies_query.with_entities(db.func.count(Company.id)).scalar() or 0
+    
+    if after_id is not None:
+        # Keyset pagination: seek past the cursor on the primary key instead of OFFSET
+        page_items = companies_query.filter(Company.id > after_id)\
+            .order_by(Company.id)\
+            .limit(per_page + 1)\
+            .all()
+        has_more = len(page_items) > per_page
+        page_items = page_items[:per_page]
+        pagination = {
+            "after_id": after_id,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page if per_page > 0 else 0,
+            "next_cursor": page_items[-1].id if has_more else None
+        }
+    else:
+        # Skip paginate()'s COUNT(*) over an ordered subquery; total is counted above
+        companies = companies_query.order_by(Company.id)\
+            .paginate(page=page, per_page=per_page, error_out=False, count=False)
+        page_items = companies.items
+        pagination = {
+            "page": companies.page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page if per_page > 0 else 0
+        }
     
     results = []
-    for company in companies.items:
+    for company in page_items:
         company_dict = company.to_dict()
         # Override person_counts with job-specific active counts
         active_pcs = company.person_counts.filter_by(job_id=job_id, is_active=True).all()
         company_dict['person_counts'] = {pc.query_name: pc.total_count for pc in active_pcs}
         results.append(company_dict)
     
-    person_counts_agg = db.session.query(
-        PersonCount.query_name,
-        db.func.sum(PersonCount.total_count).label("total")
-    ).filter_by(job_id=job_id, is_active=True).group_by(PersonCount.query_name).all()
-    
-    aggregates = {name: total for name, total in person_counts_agg}
+    if job.status == 'completed' and job.aggregate_results is not None:
+        # Totals are persisted on the job row when it completes
+        aggregates = job.aggregate_results
+    else:
+        person_counts_agg = db.session.query(
+            PersonCount.query_name,
+            db.func.sum(PersonCount.total_count).label("total")
+        ).filter_by(job_id=job_id, is_active=True).group_by(PersonCount.query_name).all()
+        
+        aggregates = {name: total for name, total in person_counts_agg}
     
     # Calculate deduplication statistics
     total_companies_found = Company.query.filter_by(job_id=job_id).count()
     total_company_references = CompanyJobReference.query.filter_by(job_id=job_id).count()
     
+    return _job_results_response(job, results, pagination, total, aggregates, total_companies_found, total_company_references)
+
+
+def _job_results_response(job, results, pagination, total_companies, aggregates, total_companies_found, total_company_references):
     return jsonify({
         "job": job.to_dict(),
         "companies": results,
-        "pagination": {
-            "page": companies.page,
-            "per_page": per_page,
-            "total": companies.total,
-            "pages": companies.pages
-        },
+        "pagination": pagination,
         "aggregates": {
-            "total_companies": job.processed_companies,
+            "total_companies": total_companies,
             "person_counts": aggregates
         },
         "deduplication_stats": {
@@ -545,161 +740,152 @@ def get_job_results(job_id):
 def export_job(job_id):
     job = Job.query.get_or_404(job_id)
     
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
     if job.mode == 'quick_tam':
-        # Quick TAM: export aggregate results
-        writer.writerow(["Metric", "Value"])
-        writer.writerow(["Job Name", job.name])
-        writer.writerow(["Mode", "Quick TAM Estimate"])
-        writer.writerow(["Total Companies", job.total_companies])
-        writer.writerow([])
-        
-        writer.writerow(["Person Search", "Aggregate Count"])
-        for query_name, count in (job.aggregate_results or {}).items():
-            writer.writerow([query_name, count])
-        
-        writer.writerow([])
-        writer.writerow(["Credits Used", job.actual_credits])
-        writer.writerow(["Completed At", job.completed_at.isoformat() if job.completed_at else ""])
+        rows = _generate_quick_tam_export(job)
     else:
-        # Detailed mode: export per-company data (include deduplicated companies via references)
-        referenced_ids = db.session.query(CompanyJobReference.company_id).filter_by(job_id=job_id)
-        companies = Company.query.filter(
-            or_(
-                Company.job_id == job_id,
-                Company.id.in_(referenced_ids)
-            )
-        ).all()
-        
-        person_query_names = set()
-        for pf in (job.person_filters or []):
-            person_query_names.add(pf.get("name", "Unnamed Query"))
-        
-        # Headers with actual Prospeo API fields only
-        headers = [
-            # Core fields
-            "prospeo_company_id", "name", "website", "domain",
-            
-            # Basic company information  
-            "description", "description_seo", "description_ai", "company_type", 
-            "industry", "employee_count", "employee_range", "founded", "logo_url",
-            
-            # Location details
-            "location_country", "location_city", "location_state", "location_country_code", 
-            "location_raw_address",
-            
-            # Social media URLs
-            "linkedin_url", "twitter_url", "facebook_url", "crunchbase_url", 
-            "instagram_url", "youtube_url",
-            
-            # Revenue information
-            "revenue_min", "revenue_max", "revenue_range_printed",
-            
-            # Attributes
-            "is_b2b", "has_demo", "has_free_trial", "has_downloadable", 
-            "has_mobile_apps", "has_online_reviews", "has_pricing",
-            
-            # Classification
-            "linkedin_id",
-            
-            # HubSpot enrichment
-            "hubspot_object_id", "hubspot_vertical", "hubspot_lookup_method"
-        ]
-        
-        # Add person query columns
-        headers.extend(sorted(person_query_names))
-        writer.writerow(headers)
-        
-        for company in companies:
-            person_counts = {pc.query_name: pc.total_count for pc in company.person_counts.filter_by(job_id=job_id, is_active=True)}
-            
-            # Helper function to serialize JSON fields for CSV
-            def serialize_json(value):
-                if value is None:
-                    return ""
-                if isinstance(value, (dict, list)):
-                    return str(value).replace(',', ';')  # Replace commas to avoid CSV issues
-                return str(value)
-            
-            row = [
-                # Core fields
-                company.prospeo_company_id or "",
-                company.name or "",
-                company.website or "",
-                company.domain or "",
-                
-                # Basic company information
-                (company.description or "")[:500] if company.description else "",  # Truncate long descriptions
-                (company.description_seo or "")[:200] if company.description_seo else "",
-                (company.description_ai or "")[:200] if company.description_ai else "",
-                company.company_type or "",
-                company.industry or "",
-                company.employee_count or "",
-                company.employee_range or "",
-                company.founded or "",
-                company.logo_url or "",
-                
-                # Location details
-                company.location_country or "",
-                company.location_city or "",
-                company.location_state or "",
-                company.location_country_code or "",
-                company.location_raw_address or "",
-                
-                # Social media URLs
-                company.linkedin_url or "",
-                company.twitter_url or "",
-                company.facebook_url or "",
-                company.crunchbase_url or "",
-                company.instagram_url or "",
-                company.youtube_url or "",
-                
-                # Revenue information
-                company.revenue_min or "",
-                company.revenue_max or "",
-                company.revenue_range_printed or "",
-                
-                # Attributes
-                company.is_b2b if company.is_b2b is not None else "",
-                company.has_demo if company.has_demo is not None else "",
-                company.has_free_trial if company.has_free_trial is not None else "",
-                company.has_downloadable if company.has_downloadable is not None else "",
-                company.has_mobile_apps if company.has_mobile_apps is not None else "",
-                company.has_online_reviews if company.has_online_reviews is not None else "",
-                company.has_pricing if company.has_pricing is not None else "",
-                
-                # Classification
-                company.linkedin_id or ""
-            ]
-            
-            # HubSpot enrichment (job-specific, active only)
-            hubspot_enrichment = company.hubspot_enrichments.filter_by(job_id=job_id, is_active=True).first()
-            if not hubspot_enrichment:
-                # Fallback to any active enrichment for this company
-                hubspot_enrichment = company.hubspot_enrichments.filter_by(is_active=True).first()
-            row.extend([
-                hubspot_enrichment.hubspot_object_id if hubspot_enrichment else "",
-                hubspot_enrichment.vertical if hubspot_enrichment else "",
-                hubspot_enrichment.lookup_method if hubspot_enrichment else ""
-            ])
-            
-            # Add person count columns
-            for qn in sorted(person_query_names):
-                row.append(person_counts.get(qn, 0))
-            
-            writer.writerow(row)
+        rows = _generate_detailed_export(job)
+    
+    headers = {
+        "Content-Disposition": f"attachment; filename=job_{job_id}_results.csv",
+        "Vary": "Accept-Encoding"
+    }
     
-    output.seek(0)
+    # CSV compresses well; gzip on the fly when the client accepts it
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        rows = _gzip_stream(rows)
+        headers["Content-Encoding"] = "gzip"
     
+    # Stream rows as they are written instead of buffering the whole file
     return Response(
-        output.getvalue(),
+        stream_with_context(rows),
         mimetype="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=job_{job_id}_results.csv"
-        }
+        headers=headers
+    )
+
+
+def _csv_field(value):
+    """Format one cell exactly as csv.writer's QUOTE_MINIMAL would."""
+    if value is None:
+        return ""
+    text_value = value if isinstance(value, str) else str(value)
+    if "," in text_value or '"' in text_value or "\n" in text_value or "\r" in text_value:
+        return '"' + text_value.replace('"', '""') + '"'
+    return text_value
+
+
+def _csv_line(values):
+    """Join a row into one CSV line; cheaper than csv.writer for the export's mostly-plain cells."""
+    return ",".join([_csv_field(value) for value in values]) + "\r\n"
+
+
+def _gzip_stream(chunks):
+    """Gzip-compress a stream of text chunks, yielding compressed bytes as they become available."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16 + MAX_WBITS selects the gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode("utf-8"))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _generate_quick_tam_export(job):
+    """Yield Quick TAM aggregate results as CSV lines."""
+    writer = csv.writer(_Echo())
+    
+    yield writer.writerow(["Metric", "Value"])
+    yield writer.writerow(["Job Name", job.name])
+    yield writer.writerow(["Mode", "Quick TAM Estimate"])
+    yield writer.writerow(["Total Companies", job.total_companies])
+    yield writer.writerow([])
+    
+    yield writer.writerow(["Person Search", "Aggregate Count"])
+    for query_name, count in (job.aggregate_results or {}).items():
+        yield writer.writerow([query_name, count])
+    
+    yield writer.writerow([])
+    yield writer.writerow(["Credits Used", job.actual_credits])
+    yield writer.writerow(["Completed At", job.completed_at.isoformat() if job.completed_at else ""])
+
+
+def _generate_detailed_export(job):
+    """Yield per-company CSV lines one row at a time so large jobs don't buffer in memory."""
+    job_id = job.id
+    
+    # Detailed mode: export per-company data (include deduplicated companies via references).
+    # Stream rows from a server-side cursor in chunks rather than materializing every Company.
+    referenced_ids = db.session.query(CompanyJobReference.company_id).filter_by(job_id=job_id)
+    job_companies = Company.query.filter(
+        or_(
+            Company.job_id == job_id,
+            Company.id.in_(referenced_ids)
+        )
     )
+    # Only the exported columns are selected, as plain rows rather than Company objects
+    companies = job_companies.with_entities(
+        Company.id,
+        *(getattr(Company, column) for column in DETAILED_EXPORT_COMPANY_COLUMNS)
+    ).order_by(Company.id).execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+    
+    # Sorted once; reused for the header and every row
+    ordered_query_names = sorted({pf.get("name", "Unnamed Query") for pf in (job.person_filters or [])})
+    
+    # Preload active person counts for the whole job in one query instead of one per company
+    counts_by_company_id = defaultdict(dict)
+    person_count_rows = db.session.query(
+        PersonCount.company_id,
+        PersonCount.query_name,
+        PersonCount.total_count
+    ).filter_by(job_id=job_id, is_active=True)
+    for company_id, query_name, total_count in person_count_rows:
+        counts_by_company_id[company_id][query_name] = total_count
+    
+    # Preload active HubSpot enrichments for the same companies: prefer this job's record,
+    # otherwise fall back to any active enrichment for the company
+    enrichment_by_company_id = {}
+    enrichment_rows = db.session.query(
+        HubSpotEnrichment.company_id,
+        HubSpotEnrichment.job_id,
+        HubSpotEnrichment.hubspot_object_id,
+        HubSpotEnrichment.vertical,
+        HubSpotEnrichment.lookup_method
+    ).filter(
+        HubSpotEnrichment.is_active == True,
+        HubSpotEnrichment.company_id.in_(job_companies.with_entities(Company.id))
+    ).order_by(HubSpotEnrichment.id)
+    for company_id, enrichment_job_id, hubspot_object_id, vertical, lookup_method in enrichment_rows:
+        current = enrichment_by_company_id.get(company_id)
+        if current is None or (enrichment_job_id == job_id and current[0] != job_id):
+            enrichment_by_company_id[company_id] = (enrichment_job_id, hubspot_object_id, vertical, lookup_method)
+    
+    headers = list(DETAILED_EXPORT_COMPANY_COLUMNS)
+    headers.extend(["hubspot_object_id", "hubspot_vertical", "hubspot_lookup_method"])
+    
+    # Add person query columns
+    headers.extend(ordered_query_names)
+    yield _csv_line(headers)
+    
+    for company_id, *values in companies:
+        person_counts = counts_by_company_id.get(company_id, {})
+        
+        # Empty values export as blanks, except attribute flags where False is kept
+        row = [
+            ("" if value is None else value) if column in DETAILED_EXPORT_FLAG_COLUMNS
+            else (value or "")[:DETAILED_EXPORT_TRUNCATE[column]] if column in DETAILED_EXPORT_TRUNCATE
+            else value or ""
+            for column, value in zip(DETAILED_EXPORT_COMPANY_COLUMNS, values)
+        ]
+        
+        # HubSpot enrichment (job-specific if present, else any active)
+        hubspot_enrichment = enrichment_by_company_id.get(company_id)
+        if hubspot_enrichment:
+            row.extend(hubspot_enrichment[1:])
+        else:
+            row.extend(["", "", ""])
+        
+        # Add person count columns
+        row.extend(person_counts.get(qn, 0) for qn in ordered_query_names)
+        
+        yield _csv_line(row)
 
 
 @app.route("/results/<int:job_id>")
@@ -1168,8 +1354,7 @@ def create_csv_upload_job():
         db.session.commit()
         
         # Start job execution
-        job_runner = start_job_async(job.id, app)
-        running_jobs[job.id] = job_runner
+        _start_job_runner(job.id, job.mode)
         
         return jsonify({
             'success': True,
@@ -1191,9 +1376,19 @@ def export_csv_job(job_id):
     if job.mode != 'csv_upload':
         return jsonify({'error': 'Export only available for CSV upload jobs'}), 400
     
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
+    # Stream rows as they are written instead of buffering the whole file
+    return Response(
+        stream_with_context(_generate_csv_upload_export(job)),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename=job_{job_id}_results.csv'
+        }
+    )
+
+
+def _generate_csv_upload_export(job):
+    """Yield CSV upload job results one row at a time."""
+    writer = csv.writer(_Echo())
     
     # Build headers: company info + per-persona count & source + vertical
     headers = ['Company Name', 'HubSpot ID', 'Domain']
@@ -1205,10 +1400,41 @@ def export_csv_job(job_id):
         headers.append(f'{pf_name} (Source)')
         headers.append(f'{pf_name} (Status)')
     headers.append('Vertical')
-    writer.writerow(headers)
+    yield writer.writerow(headers)
+    
+    # Preload active person counts and enrichment verticals for the job's CSV companies
+    # in two queries instead of (persona count + 1) queries per exported row
+    csv_company_ids = db.session.query(CsvCompany.id).filter_by(job_id=job.id)
+    person_count_by_key = {}
+    person_count_rows = db.session.query(
+        PersonCount.csv_company_id,
+        PersonCount.query_name,
+        PersonCount.total_count,
+        PersonCount.status,
+        PersonCount.data_source
+    ).filter(
+        PersonCount.is_active == True,
+        PersonCount.csv_company_id.in_(csv_company_ids)
+    ).order_by(PersonCount.id)
+    for csv_company_id, query_name, total_count, status, data_source in person_count_rows:
+        person_count_by_key.setdefault((csv_company_id, query_name), (total_count, status, data_source))
+    
+    vertical_by_csv_company_id = {}
+    enrichment_rows = db.session.query(
+        HubSpotEnrichment.csv_company_id,
+        HubSpotEnrichment.vertical
+    ).filter(
+        HubSpotEnrichment.is_active == True,
+        HubSpotEnrichment.csv_company_id.in_(csv_company_ids)
+    ).order_by(HubSpotEnrichment.id)
+    for csv_company_id, vertical in enrichment_rows:
+        vertical_by_csv_company_id.setdefault(csv_company_id, vertical)
     
-    # Write data rows
-    csv_companies = CsvCompany.query.filter_by(job_id=job.id).all()
+    # Write data rows, fetching CsvCompany rows in chunks from a server-side cursor
+    csv_companies = CsvCompany.query.filter_by(job_id=job.id)\
+        .order_by(CsvCompany.id)\
+        .execution_options(stream_results=True)\
+        .yield_per(EXPORT_BATCH_SIZE)
     for csv_company in csv_companies:
         row = [
             csv_company.company_name or csv_company.domain,
@@ -1218,34 +1444,21 @@ def export_csv_job(job_id):
         
         # Add person counts for each filter
         for pf_name in person_filter_names:
-            pc = csv_company.person_counts.filter_by(
-                query_name=pf_name, 
-                is_active=True
-            ).first()
+            pc = person_count_by_key.get((csv_company.id, pf_name))
             if pc:
-                row.append(pc.total_count if pc.status == 'ok' else '')
-                row.append('Existing' if pc.data_source == 'existing_reuse' else 'New')
-                row.append(pc.status)
+                total_count, status, data_source = pc
+                row.append(total_count if status == 'ok' else '')
+                row.append('Existing' if data_source == 'existing_reuse' else 'New')
+                row.append(status)
             else:
                 row.append('')
                 row.append('')
                 row.append('pending')
         
         # Add vertical from enrichment
-        enrichment = csv_company.hubspot_enrichments.filter_by(is_active=True).first()
-        row.append(enrichment.vertical if enrichment else '')
+        row.append(vertical_by_csv_company_id.get(csv_company.id) or '')
         
-        writer.writerow(row)
-    
-    # Create response
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={
-            'Content-Disposition': f'attachment; filename=job_{job_id}_results.csv'
-        }
-    )
+        yield writer.writerow(row)
 
 
 if __name__ == "__main__":
@@ -26,16 +26,34 @@ def get_database_url():
     
     return url
 
+def get_engine_options(url):
+    options = {
+        "pool_pre_ping": True,  # Test connections before using
+        "pool_recycle": 300,    # Recycle connections every 5 min
+    }
+    
+    if url.startswith("postgresql"):
+        # Job runner threads and request threads share each worker's pool
+        options.update({
+            "pool_size": 10,
+            "max_overflow": 20,
+            "pool_timeout": 10,
+            # Reuse the most recently returned connection so bursts stay on warm connections
+            # and the rest sit idle long enough for pool_recycle to retire them
+            "pool_use_lifo": True,
+            # No server-side prepared statements, so connections stay safe behind pgbouncer
+            "connect_args": {"prepare_threshold": None},
+        })
+    
+    return options
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-prod")
     SQLALCHEMY_DATABASE_URI = get_database_url()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # Engine options to handle connection pooling and SSL issues
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_pre_ping": True,  # Test connections before using
-        "pool_recycle": 300,    # Recycle connections every 5 min
-    }
+    SQLALCHEMY_ENGINE_OPTIONS = get_engine_options(SQLALCHEMY_DATABASE_URI)
     
     PROSPEO_API_KEY = os.getenv("PROSPEO_API_KEY")
     PROSPEO_BASE_URL = "https://api.prospeo.io"
@@ -44,6 +62,30 @@ class Config:
     PROSPEO_MAX_PER_SECOND = 30
     PROSPEO_MAX_PER_MINUTE = 1800
     
+    # Max concurrent Prospeo requests when fanning out independent searches
+    PROSPEO_MAX_CONCURRENT_REQUESTS = 8
+    
+    # Company search pages a job requests ahead of the page it is processing
+    JOB_PAGE_PREFETCH = 3
+    
+    # Page-1 search responses reused between preview and Quick TAM
+    PROSPEO_SEARCH_CACHE_TTL_SECONDS = 300
+    PROSPEO_SEARCH_CACHE_MAX_ENTRIES = 1024
+    
+    # Jobs running at once per web worker; later jobs wait for a free slot
+    MAX_CONCURRENT_JOBS = 2
+    
+    # Quick TAM jobs finish within a few API calls, so they get their own slots rather
+    # than waiting behind long detailed or CSV jobs
+    MAX_CONCURRENT_QUICK_TAM_JOBS = 4
+    
+    # Minimum seconds between a running job's progress commits
+    JOB_COMMIT_INTERVAL_SECONDS = 2
+    
+    # Minimum seconds between a running job's reads of its own status, to notice /stop
+    # requests served by other workers
+    JOB_STOP_POLL_INTERVAL_SECONDS = 2
+    
     # HubSpot API configuration
     HUBSPOT_API_KEY = os.getenv("HUBSPOT_API_KEY")
     HUBSPOT_BASE_URL = "https://api.hubapi.com"
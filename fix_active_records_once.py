@@ -15,31 +15,151 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from models.database import db, PersonCount, HubSpotEnrichment
 from config import Config
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, inspect, text
 from datetime import datetime
 
-def fix_active_records():
-    """Fix corrupted is_active data with proper deduplication."""
+MIGRATION_NAME = 'fix_active_records'
+
+# Ids per committed batch when rewriting is_active on PostgreSQL
+DEDUP_BATCH_SIZE = 50000
+
+# SQLite settings for the fix's large rewrites. synchronous=OFF skips the per-commit fsync,
+# which is safe here because an interrupted fix is simply re-run; the cache is ~200 MB.
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-200000",
+    "PRAGMA temp_store=MEMORY",
+]
+
+# Partial indexes matching each dedup grouping's (group, created_at DESC, id DESC) order, so picking the
+# newest row per group reads an index instead of sorting the table; dropped when the fix ends.
+# (name, table, columns, predicate)
+DEDUP_INDEXES = [
+    ("tmp_pc_dedup_prospeo", "person_counts", "prospeo_company_id, query_name, created_at DESC, id DESC", "prospeo_company_id IS NOT NULL"),
+    ("tmp_pc_dedup_company", "person_counts", "company_id, query_name, created_at DESC, id DESC", "prospeo_company_id IS NULL"),
+    ("tmp_he_dedup_hubspot", "hubspot_enrichments", "hubspot_object_id, created_at DESC, id DESC", "hubspot_object_id IS NOT NULL"),
+    ("tmp_he_dedup_company", "hubspot_enrichments", "company_id, created_at DESC, id DESC", "hubspot_object_id IS NULL"),
+]
+
+def _update_active_in_batches(conn, table, groups):
+    """Set is_active on PostgreSQL to each group's newest row, one committed id range at a time.
+    
+    groups is a list of (key columns, predicate). The newest ids come from a snapshot, but a row
+    is only changed if a check at write time agrees: rows jobs insert or retire after the snapshot
+    are never deactivated while still newest, nor reactivated once a newer row exists.
+    """
+    ids_table = f"{table}_latest_ids"
+    latest_ids_sql = " UNION ALL ".join(
+        f"(SELECT DISTINCT ON ({keys}) id FROM {table} WHERE {predicate} ORDER BY {keys}, created_at DESC, id DESC)"
+        for keys, predicate in groups
+    )
+    # True when a newer row of the same group exists now, including rows written since the snapshot
+    newer_row_exists = " OR ".join(
+        f"({predicate} AND EXISTS (SELECT 1 FROM {table} n WHERE {predicate} AND "
+        + " AND ".join(f"n.{key} IS NOT DISTINCT FROM {table}.{key}" for key in keys.split(", "))
+        + f" AND (n.created_at, n.id) > ({table}.created_at, {table}.id)))"
+        for keys, predicate in groups
+    )
+    in_latest = f"EXISTS (SELECT 1 FROM {ids_table} l WHERE l.id = {table}.id)"
+    
+    # One snapshot for the newest ids and the id range, so no row lands between the two
+    conn.commit()
+    conn.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {ids_table}"))
+    conn.execute(text(f"CREATE TEMP TABLE {ids_table} AS {latest_ids_sql}"))
+    conn.execute(text(f"ALTER TABLE {ids_table} ADD PRIMARY KEY (id)"))
+    min_id, max_id = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {table}")).fetchone()
+    conn.commit()
+    
+    updated = 0
+    if min_id is None:
+        return updated
+    
+    for lo in range(min_id, max_id + 1, DEDUP_BATCH_SIZE):
+        result = conn.execute(text(f"""
+            UPDATE {table}
+            SET is_active = {in_latest}
+            WHERE id BETWEEN :lo AND :hi
+              AND (
+                (is_active IS NOT FALSE AND NOT {in_latest} AND ({newer_row_exists}))
+                OR (is_active IS NOT TRUE AND {in_latest} AND NOT ({newer_row_exists}))
+              )
+        """), {"lo": lo, "hi": lo + DEDUP_BATCH_SIZE - 1})
+        conn.commit()
+        updated += result.rowcount
+    
+    return updated
+
+def _create_index(engine, conn, name, table, columns, predicate, unique=False):
+    """Create a partial index; PostgreSQL builds it CONCURRENTLY so running jobs can keep writing."""
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if engine.dialect.name != 'postgresql':
+        conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns}) WHERE {predicate}"))
+        conn.commit()
+        return
+    
+    # A concurrent build waits out open transactions, including this connection's, and
+    # can't run inside one itself, so it gets its own autocommit connection
+    conn.commit()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as index_conn:
+        try:
+            index_conn.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns}) WHERE {predicate}"))
+        except Exception:
+            # A failed concurrent build leaves an invalid index behind that IF NOT EXISTS would keep
+            index_conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            raise
+
+def _count_by_active(conn, table):
+    """Return (total, active, inactive) row counts for a table from one grouped scan."""
+    counts = {
+        is_active: count
+        for is_active, count in conn.execute(text(f"SELECT is_active, COUNT(*) FROM {table} GROUP BY is_active"))
+    }
+    return sum(counts.values()), counts.get(True, 0), counts.get(False, 0)
+
+def _already_applied(conn):
+    """True when migration_log records a completed run of this fix."""
+    if not inspect(conn).has_table('migration_log'):
+        return False
+    return conn.execute(
+        text("SELECT 1 FROM migration_log WHERE name = :name"),
+        {"name": MIGRATION_NAME}
+    ).first() is not None
+
+def fix_active_records(force=False):
+    """Fix corrupted is_active data with proper deduplication.
+    
+    PostgreSQL commits in id batches; the fix is idempotent, so an interrupted run can simply be re-run.
+    A completed run is recorded in migration_log and later runs return early unless force is set.
+    """
     
     # Connect to database
     if Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
         engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+        
+        @event.listens_for(engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.close()
     else:
         # Production PostgreSQL
         engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
     
     with engine.connect() as conn:
-        trans = conn.begin()
+        if not force and _already_applied(conn):
+            print("is_active data fix already applied (see migration_log); use --force to run it again")
+            return
+        conn.rollback()  # End the check's implicit transaction before the fix's own
         
         try:
             print("Starting is_active data fix...")
             
             # Check current state
-            pc_total = conn.execute(text("SELECT COUNT(*) FROM person_counts")).fetchone()[0]
-            pc_active = conn.execute(text("SELECT COUNT(*) FROM person_counts WHERE is_active = TRUE")).fetchone()[0]
-            
-            he_total = conn.execute(text("SELECT COUNT(*) FROM hubspot_enrichments")).fetchone()[0] 
-            he_active = conn.execute(text("SELECT COUNT(*) FROM hubspot_enrichments WHERE is_active = TRUE")).fetchone()[0]
+            pc_total, pc_active, _ = _count_by_active(conn, "person_counts")
+            he_total, he_active, _ = _count_by_active(conn, "hubspot_enrichments")
             
             print(f"BEFORE: PersonCount - {pc_active}/{pc_total} active")
             print(f"BEFORE: HubSpotEnrichment - {he_active}/{he_total} active")
@@ -47,26 +167,22 @@ def fix_active_records():
             if pc_active == pc_total and he_active == he_total and pc_total > 0:
                 print("⚠️  Data appears corrupted - ALL records are marked active!")
             
-            # Step 1: Set ALL records to inactive first
-            print("\nStep 1: Setting all records to inactive...")
+            is_sqlite = Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite')
             
-            conn.execute(text("UPDATE person_counts SET is_active = FALSE"))
-            updated_pc = conn.rowcount if hasattr(conn, 'rowcount') else pc_total
-            print(f"Set {updated_pc} PersonCount records to inactive")
+            print("\nCreating temporary dedup indexes...")
+            for name, table, columns, predicate in DEDUP_INDEXES:
+                _create_index(engine, conn, name, table, columns, predicate)
             
-            conn.execute(text("UPDATE hubspot_enrichments SET is_active = FALSE"))  
-            updated_he = conn.rowcount if hasattr(conn, 'rowcount') else he_total
-            print(f"Set {updated_he} HubSpotEnrichment records to inactive")
+            # Each table's rows are written only when their is_active value actually changes.
+            # Rows with a NULL primary grouping key fall back to company_id.
             
-            # Step 2: PersonCount deduplication - latest per (prospeo_company_id, query_name)
-            print("\nStep 2: PersonCount deduplication...")
+            # Step 1: PersonCount deduplication - latest per (prospeo_company_id, query_name)
+            print("\nStep 1: PersonCount deduplication...")
             
-            if Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+            if is_sqlite:
                 # SQLite version with different syntax
                 conn.execute(text("""
-                    UPDATE person_counts 
-                    SET is_active = TRUE 
-                    WHERE id IN (
+                    WITH latest AS (
                         SELECT id FROM (
                             SELECT id, 
                                    ROW_NUMBER() OVER (PARTITION BY prospeo_company_id, query_name ORDER BY created_at DESC) as rn
@@ -74,13 +190,7 @@ def fix_active_records():
                             WHERE prospeo_company_id IS NOT NULL
                         ) 
                         WHERE rn = 1
-                    )
-                """))
-                # Also handle records with NULL prospeo_company_id separately  
-                conn.execute(text("""
-                    UPDATE person_counts 
-                    SET is_active = TRUE 
-                    WHERE id IN (
+                        UNION ALL
                         SELECT id FROM (
                             SELECT id, 
                                    ROW_NUMBER() OVER (PARTITION BY company_id, query_name ORDER BY created_at DESC) as rn
@@ -89,46 +199,25 @@ def fix_active_records():
                         ) 
                         WHERE rn = 1
                     )
-                """))
-            else:
-                # PostgreSQL version
-                conn.execute(text("""
                     UPDATE person_counts 
-                    SET is_active = TRUE 
-                    WHERE id IN (
-                        SELECT id FROM (
-                            SELECT id, 
-                                   ROW_NUMBER() OVER (PARTITION BY prospeo_company_id, query_name ORDER BY created_at DESC) as rn
-                            FROM person_counts
-                            WHERE prospeo_company_id IS NOT NULL
-                        ) ranked
-                        WHERE rn = 1
-                    )
-                """))
-                # Also handle records with NULL prospeo_company_id separately
-                conn.execute(text("""
-                    UPDATE person_counts 
-                    SET is_active = TRUE 
-                    WHERE id IN (
-                        SELECT id FROM (
-                            SELECT id, 
-                                   ROW_NUMBER() OVER (PARTITION BY company_id, query_name ORDER BY created_at DESC) as rn
-                            FROM person_counts
-                            WHERE prospeo_company_id IS NULL
-                        ) ranked
-                        WHERE rn = 1
-                    )
+                    SET is_active = (id IN (SELECT id FROM latest))
+                    WHERE is_active IS NOT (id IN (SELECT id FROM latest))
                 """))
+            else:
+                # PostgreSQL: DISTINCT ON picks each group's newest row without numbering every row
+                updated = _update_active_in_batches(conn, "person_counts", [
+                    ("prospeo_company_id, query_name", "prospeo_company_id IS NOT NULL"),
+                    ("company_id, query_name", "prospeo_company_id IS NULL"),
+                ])
+                print(f"Updated {updated} PersonCount records")
             
-            # Step 3: HubSpotEnrichment deduplication - latest per hubspot_object_id
-            print("Step 3: HubSpotEnrichment deduplication...")
+            # Step 2: HubSpotEnrichment deduplication - latest per hubspot_object_id
+            print("Step 2: HubSpotEnrichment deduplication...")
             
-            if Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+            if is_sqlite:
                 # SQLite version
                 conn.execute(text("""
-                    UPDATE hubspot_enrichments 
-                    SET is_active = TRUE 
-                    WHERE id IN (
+                    WITH latest AS (
                         SELECT id FROM (
                             SELECT id, 
                                    ROW_NUMBER() OVER (PARTITION BY hubspot_object_id ORDER BY created_at DESC) as rn
@@ -136,13 +225,7 @@ def fix_active_records():
                             WHERE hubspot_object_id IS NOT NULL
                         )
                         WHERE rn = 1
-                    )
-                """))
-                # Handle records with NULL hubspot_object_id separately
-                conn.execute(text("""
-                    UPDATE hubspot_enrichments 
-                    SET is_active = TRUE 
-                    WHERE id IN (
+                        UNION ALL
                         SELECT id FROM (
                             SELECT id, 
                                    ROW_NUMBER() OVER (PARTITION BY company_id ORDER BY created_at DESC) as rn
@@ -151,45 +234,42 @@ def fix_active_records():
                         )
                         WHERE rn = 1
                     )
-                """))
-            else:
-                # PostgreSQL version  
-                conn.execute(text("""
                     UPDATE hubspot_enrichments 
-                    SET is_active = TRUE 
-                    WHERE id IN (
-                        SELECT id FROM (
-                            SELECT id, 
-                                   ROW_NUMBER() OVER (PARTITION BY hubspot_object_id ORDER BY created_at DESC) as rn
-                            FROM hubspot_enrichments
-                            WHERE hubspot_object_id IS NOT NULL
-                        ) ranked
-                        WHERE rn = 1
-                    )
-                """))
-                # Handle records with NULL hubspot_object_id separately
-                conn.execute(text("""
-                    UPDATE hubspot_enrichments 
-                    SET is_active = TRUE 
-                    WHERE id IN (
-                        SELECT id FROM (
-                            SELECT id, 
-                                   ROW_NUMBER() OVER (PARTITION BY company_id ORDER BY created_at DESC) as rn
-                            FROM hubspot_enrichments
-                            WHERE hubspot_object_id IS NULL
-                        ) ranked
-                        WHERE rn = 1
-                    )
+                    SET is_active = (id IN (SELECT id FROM latest))
+                    WHERE is_active IS NOT (id IN (SELECT id FROM latest))
                 """))
+            else:
+                # PostgreSQL version
+                updated = _update_active_in_batches(conn, "hubspot_enrichments", [
+                    ("hubspot_object_id", "hubspot_object_id IS NOT NULL"),
+                    ("company_id", "hubspot_object_id IS NULL"),
+                ])
+                print(f"Updated {updated} HubSpotEnrichment records")
+                
+                # Reclaim the dead tuples left by the rewrite and refresh planner statistics;
+                # VACUUM can't run inside a transaction, so it gets its own autocommit connection
+                print("Vacuuming deduplicated tables...")
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as vacuum_conn:
+                    vacuum_conn.execute(text("VACUUM (ANALYZE) person_counts"))
+                    vacuum_conn.execute(text("VACUUM (ANALYZE) hubspot_enrichments"))
             
-            # Step 4: Verify results
-            print("\nStep 4: Verifying results...")
+            # With the duplicates gone, let the database keep a company's active person count
+            # unique per query; the job writers already retire the old row before inserting
+            try:
+                _create_index(
+                    engine, conn, "ux_person_counts_active_company_query", "person_counts",
+                    "company_id, query_name", "is_active AND company_id IS NOT NULL", unique=True
+                )
+                print("Active person count unique index in place")
+            except Exception as index_error:
+                conn.rollback()
+                print(f"Note: Could not create active person count unique index: {index_error}")
             
-            pc_active_after = conn.execute(text("SELECT COUNT(*) FROM person_counts WHERE is_active = TRUE")).fetchone()[0]
-            pc_inactive_after = conn.execute(text("SELECT COUNT(*) FROM person_counts WHERE is_active = FALSE")).fetchone()[0]
+            # Step 3: Verify results
+            print("\nStep 3: Verifying results...")
             
-            he_active_after = conn.execute(text("SELECT COUNT(*) FROM hubspot_enrichments WHERE is_active = TRUE")).fetchone()[0] 
-            he_inactive_after = conn.execute(text("SELECT COUNT(*) FROM hubspot_enrichments WHERE is_active = FALSE")).fetchone()[0]
+            _, pc_active_after, pc_inactive_after = _count_by_active(conn, "person_counts")
+            _, he_active_after, he_inactive_after = _count_by_active(conn, "hubspot_enrichments")
             
             print(f"AFTER: PersonCount - {pc_active_after} active, {pc_inactive_after} inactive")
             print(f"AFTER: HubSpotEnrichment - {he_active_after} active, {he_inactive_after} inactive")
@@ -204,7 +284,7 @@ def fix_active_records():
                 print(f"HubSpotEnrichment deduplication: {he_dedup_ratio:.1f}% records marked inactive")
             
             # Commit the transaction
-            trans.commit()
+            conn.commit()
             
             print(f"\n✅ Migration completed successfully!")
             print(f"   PersonCount: {pc_active_after}/{pc_total} records now active")
@@ -213,18 +293,32 @@ def fix_active_records():
             # Mark migration as completed
             try:
                 conn.execute(text("CREATE TABLE IF NOT EXISTS migration_log (name VARCHAR(255) PRIMARY KEY, completed_at TIMESTAMP)"))
-                conn.execute(text("INSERT OR IGNORE INTO migration_log (name, completed_at) VALUES ('fix_active_records', ?)"), (datetime.utcnow(),))
+                conn.execute(
+                    text("""
+                        INSERT INTO migration_log (name, completed_at)
+                        SELECT :name, :completed_at
+                        WHERE NOT EXISTS (SELECT 1 FROM migration_log WHERE name = :name)
+                    """),
+                    {"name": MIGRATION_NAME, "completed_at": datetime.utcnow()}
+                )
                 conn.commit()
                 print("Migration logged successfully")
             except Exception as log_error:
                 print(f"Note: Could not log migration completion: {log_error}")
             
         except Exception as e:
-            trans.rollback()
+            conn.rollback()
             print(f"❌ Migration failed: {e}")
             import traceback
             traceback.print_exc()
             sys.exit(1)
+        finally:
+            try:
+                for name, _, _, _ in DEDUP_INDEXES:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                conn.commit()
+            except Exception as drop_error:
+                print(f"Note: Could not drop temporary dedup indexes: {drop_error}")
 
 if __name__ == "__main__":
     print("=== Fix Active Records Migration ===")
@@ -235,4 +329,4 @@ if __name__ == "__main__":
         print("Aborted")
         sys.exit(0)
     
-    fix_active_records()
+    fix_active_records(force="--force" in sys.argv[1:])
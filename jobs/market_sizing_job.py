@@ -1,22 +1,178 @@
+import json
 import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from types import SimpleNamespace
+from config import Config
 from models.database import db, Job, Company, PersonCount, HubSpotEnrichment, CompanyJobReference, CsvCompany, HubSpotCache
 from services.prospeo_client import ProspeoClient
-from services.domain_utils import registrable_root_domain
+from services.domain_utils import registrable_root_domain, get_search_domains_priority_order
 from services.query_segmenter import QuerySegmenter
 from services.hubspot_client_cached import HubSpotClientCached
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, insert, tuple_, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+# (column, key) pairs copied from a Prospeo company response
+COMPANY_FIELDS = (
+    ("name", "name"),
+    ("website", "website"),
+    ("domain", "domain"),
+    ("description", "description"),
+    ("description_seo", "description_seo"),
+    ("description_ai", "description_ai"),
+    ("company_type", "type"),
+    ("industry", "industry"),
+    ("employee_count", "employee_count"),
+    ("employee_range", "employee_range"),
+    ("founded", "founded"),
+    ("other_websites", "other_websites"),
+    ("keywords", "keywords"),
+    ("logo_url", "logo_url"),
+    ("email_tech", "email_tech"),
+    ("phone_hq", "phone_hq"),
+    ("linkedin_url", "linkedin_url"),
+    ("twitter_url", "twitter_url"),
+    ("facebook_url", "facebook_url"),
+    ("crunchbase_url", "crunchbase_url"),
+    ("instagram_url", "instagram_url"),
+    ("youtube_url", "youtube_url"),
+    ("revenue_range_printed", "revenue_range_printed"),
+    ("funding", "funding"),
+    ("technology", "technology"),
+    ("job_postings", "job_postings"),
+    ("sic_codes", "sic_codes"),
+    ("naics_codes", "naics_codes"),
+    ("linkedin_id", "linkedin_id"),
+)
+
+# (column, key) pairs flattened from the response's "location" object
+COMPANY_LOCATION_FIELDS = (
+    ("location_country", "country"),
+    ("location_city", "city"),
+    ("location_state", "state"),
+    ("location_country_code", "country_code"),
+    ("location_raw_address", "raw_address"),
+)
+
+# (column, key) pairs flattened from the response's "revenue_range" object
+COMPANY_REVENUE_FIELDS = (
+    ("revenue_min", "min"),
+    ("revenue_max", "max"),
+)
+
+# Boolean flags Prospeo nests under a company's "attributes" object
+COMPANY_ATTRIBUTE_FIELDS = (
+    "is_b2b", "has_demo", "has_free_trial", "has_downloadable",
+    "has_mobile_apps", "has_online_reviews", "has_pricing"
+)
+
+# CSV companies loaded per query while a CSV upload job runs
+CSV_COMPANY_BATCH_SIZE = 200
+
+# Tries at a page's person count save when concurrent jobs race on the same companies' active records
+PERSON_COUNT_SAVE_ATTEMPTS = 3
+
+# PostgreSQL SQLSTATEs for a deadlock and a serialization failure, both safe to retry
+TRANSIENT_LOCK_SQLSTATES = ('40P01', '40001')
+
+def _is_transient_lock_conflict(error):
+    """True when a DBAPI error is a deadlock or serialization failure (psycopg2 or psycopg 3)."""
+    orig = getattr(error, "orig", None)
+    return (getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)) in TRANSIENT_LOCK_SQLSTATES
+
+def build_aggregate_person_filters(person_config, company_filters):
+    """Merge company filters into a person query for aggregate (Quick TAM) counts."""
+    p_filters = dict(person_config.get("filters", {}))
+    
+    # Merge company filters into person search (valid per Prospeo docs)
+    p_filters.update(company_filters or {})
+    
+    # Prospeo rejects include+exclude simultaneously on person_department
+    dept = p_filters.get("person_department")
+    if isinstance(dept, dict) and dept.get("include") and dept.get("exclude"):
+        p_filters["person_department"] = {"include": dept["include"]}
+    
+    return p_filters
+
+
+@contextmanager
+def no_expire_on_commit(session):
+    """Keep loaded attributes across commits while the block runs, restoring the setting after."""
+    previous = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        yield session
+    finally:
+        session.expire_on_commit = previous
+
 
 class MarketSizingJob:
-    def __init__(self, job_id):
+    def __init__(self, job_id, on_finish=None):
         self.job_id = job_id
+        self.on_finish = on_finish  # Called with job_id once the runner thread exits
         self.client = ProspeoClient()
         self.hubspot_client = None  # Lazy load to prevent initialization errors from blocking job
         self.segmenter = QuerySegmenter(self.client)
-        self._stop_requested = False
+        self._stop_event = threading.Event()  # Set by stop() or once the job row reads 'stopped'
+        self._last_stop_poll_at = 0.0  # time.monotonic() of the last job status read
+        self._company_cache = {}  # This job's companies by Prospeo id, loaded once per job
+        self._person_search_templates = None  # [(query_name, filters)], built once per job
+        self._last_commit_at = 0.0  # time.monotonic() of the last progress commit
+        # Successful person search results by (query_name, domain); companies sharing a domain
+        # send identical searches, so each is only paid for once per job
+        self._person_search_cache = {}
+        self._person_search_cache_lock = threading.Lock()
+        # Search threads are reused for the whole job rather than started per page or company.
+        # Company tasks wait on their query tasks, so each level has its own pool
+        self._company_pool = ThreadPoolExecutor(
+            max_workers=Config.PROSPEO_MAX_CONCURRENT_REQUESTS, thread_name_prefix=f"job-{job_id}-company"
+        )
+        self._query_pool = ThreadPoolExecutor(
+            max_workers=Config.PROSPEO_MAX_CONCURRENT_REQUESTS, thread_name_prefix=f"job-{job_id}-query"
+        )
 
     def stop(self):
-        self._stop_requested = True
+        self._stop_event.set()
+
+    @staticmethod
+    def _record_progress(job, processed, skipped, credits):
+        """Set the job's progress counters, touching only the ones that changed (skipped=None keeps it)."""
+        if job.processed_companies != processed:
+            job.processed_companies = processed
+        if skipped is not None and job.companies_skipped != skipped:
+            job.companies_skipped = skipped
+        if job.actual_credits != credits:
+            job.actual_credits = credits
+
+    def _checkpoint_progress(self, job, processed, skipped, credits):
+        """Record progress and commit once JOB_COMMIT_INTERVAL_SECONDS have passed, otherwise flush.
+        
+        Slow pages still commit every time; fast ones (e.g. all person counts reused) are grouped
+        so a run of them costs one commit instead of one each. The counters are only assigned
+        when committing, so the flushes in between don't each UPDATE the job row.
+        """
+        if time.monotonic() - self._last_commit_at >= Config.JOB_COMMIT_INTERVAL_SECONDS:
+            self._record_progress(job, processed, skipped, credits)
+            db.session.commit()
+            self._last_commit_at = time.monotonic()
+        else:
+            db.session.flush()
+
+    def _stop_was_requested(self, job):
+        """True once stop() is called or the job row is marked stopped.
+        
+        /stop may be served by another gunicorn worker that can't reach this runner,
+        so the persisted status is checked as well, at most once per
+        JOB_STOP_POLL_INTERVAL_SECONDS; callers poll between units of work.
+        """
+        if not self._stop_event.is_set() and time.monotonic() - self._last_stop_poll_at >= Config.JOB_STOP_POLL_INTERVAL_SECONDS:
+            self._last_stop_poll_at = time.monotonic()
+            if db.session.query(Job.status).filter_by(id=job.id).scalar() == 'stopped':
+                self._stop_event.set()
+        return self._stop_event.is_set()
 
     def run(self, app):
         import logging
@@ -31,16 +187,34 @@ class MarketSizingJob:
                     logger.error(f"JOB {self.job_id}: Job not found in database")
                     return
                 
+                if self._stop_was_requested(job):
+                    logger.info(f"JOB {self.job_id}: Stopped before it started")
+                    return
+                
                 logger.info(f"JOB {self.job_id}: Setting status to running")
                 job.status = 'running'
                 job.started_at = datetime.utcnow()
-                db.session.commit()
+                if job.mode != 'quick_tam':
+                    # Quick TAM finishes within a few API calls, so it commits once at the end
+                    db.session.commit()
                 
                 try:
                     logger.info(f"JOB {self.job_id}: Starting execution")
-                    self._execute(job)
+                    # The runner is the only writer of its job's companies and progress, and
+                    # reads the stop flag with a column query, so progress commits don't need to
+                    # expire (and lazily re-SELECT) every company the job has already loaded
+                    with no_expire_on_commit(db.session()):
+                        self._execute(job)
                     logger.info(f"JOB {self.job_id}: Execution completed successfully")
-                    job.status = 'completed'
+                    self._store_aggregate_results(job)
+                    # Don't overwrite the 'stopped' status written by /stop. The stop flag is only
+                    # polled every few seconds, so 'completed' is written only if the row isn't stopped
+                    if not self._stop_event.is_set():
+                        marked = Job.query.filter(Job.id == job.id, Job.status != 'stopped')\
+                            .update({"status": 'completed'}, synchronize_session=False)
+                        if not marked:
+                            self._stop_event.set()
+                    job.status = 'stopped' if self._stop_event.is_set() else 'completed'
                     job.completed_at = datetime.utcnow()
                 except Exception as e:
                     logger.error(f"JOB {self.job_id}: Execution failed: {e}")
@@ -56,6 +230,23 @@ class MarketSizingJob:
             logger.error(f"JOB {self.job_id}: Thread crashed: {e}")
             import traceback
             logger.error(f"JOB {self.job_id}: Thread traceback: {traceback.format_exc()}")
+        finally:
+            self._company_pool.shutdown(cancel_futures=True)
+            self._query_pool.shutdown(cancel_futures=True)
+            if self.on_finish:
+                self.on_finish(self.job_id)
+
+    def _store_aggregate_results(self, job):
+        """Persist per-query person count totals on the job so completed results are served without re-aggregating."""
+        if job.mode == 'quick_tam':
+            return  # Quick TAM stores its aggregate search counts directly
+        
+        totals = db.session.query(
+            PersonCount.query_name,
+            db.func.sum(PersonCount.total_count)
+        ).filter_by(job_id=job.id, is_active=True).group_by(PersonCount.query_name).all()
+        
+        job.aggregate_results = {name: total for name, total in totals}
 
     def _execute(self, job):
         import logging
@@ -73,12 +264,72 @@ class MarketSizingJob:
         logger.info(f"  Job mode: {job.mode}")
         
         # Route to appropriate execution method based on job mode
-        if job.mode == 'csv_upload':
+        if job.mode == 'quick_tam':
+            return self._execute_quick_tam_job(job)
+        elif job.mode == 'csv_upload':
             return self._execute_csv_upload_job(job)
         else:
             # Standard Prospeo company search + person search execution
             return self._execute_standard_job(job)
     
+    def _execute_quick_tam_job(self, job):
+        """Quick TAM: one company search for the total plus one aggregate person search per query."""
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        logger.info(f"JOB {job.id}: Company Search")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({"endpoint": "/search-company", "payload": {"page": 1, "filters": job.company_filters}}, indent=2))
+        
+        # Cached lookups let a job started right after /api/preview reuse its responses for free
+        response = self.client.search_companies(job.company_filters, page=1, cached=True)
+        
+        if self.client.is_error(response):
+            raise RuntimeError(f"Company search failed: {self.client.get_error_code(response)}")
+        
+        pagination = self.client.get_pagination(response)
+        job.total_companies = pagination["total_count"]
+        credits_used = 0 if response.get("_cached") else 1
+        
+        person_searches = []
+        for person_config in (job.person_filters or []):
+            query_name = person_config.get("name", "Unnamed Query")
+            p_filters = build_aggregate_person_filters(person_config, job.company_filters)
+            
+            logger.info(f"JOB {job.id}: Person Search [{query_name}]")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(json.dumps({"endpoint": "/search-person", "payload": {"page": 1, "filters": p_filters}}, indent=2))
+            person_searches.append((query_name, p_filters))
+        
+        # Independent searches run concurrently through the client's shared rate limiter
+        p_responses = self.client.search_people_many([p_filters for _, p_filters in person_searches], cached=True)
+        
+        aggregate_results = {}
+        for (query_name, _), p_response in zip(person_searches, p_responses):
+            if not p_response.get("_cached"):
+                credits_used += 1
+            
+            logger.info(f"JOB {job.id}: Person Search [{query_name}] RESPONSE")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(json.dumps({
+                    "http_status": p_response.get("_http_status"),
+                    "error": p_response.get("error"),
+                    "error_code": p_response.get("error_code"),
+                    "filter_error": p_response.get("filter_error"),
+                    "pagination": p_response.get("pagination"),
+                    "result_count": len(p_response.get("results") or [])
+                }, indent=2))
+            
+            if not self.client.is_error(p_response):
+                p_pagination = self.client.get_pagination(p_response)
+                aggregate_results[query_name] = p_pagination["total_count"]
+            else:
+                logger.warning(f"Person search failed for [{query_name}]: {self.client.get_error_code(p_response)}")
+                aggregate_results[query_name] = 0
+        
+        job.aggregate_results = aggregate_results
+        job.actual_credits = credits_used
+
     def _execute_standard_job(self, job):
         import logging
         logger = logging.getLogger(__name__)
@@ -108,13 +359,21 @@ class MarketSizingJob:
         job.estimated_credits = plan["credits_estimate"]
         db.session.commit()
         
+        # Companies this job already saved (e.g. before a restart) are looked up once here;
+        # _save_company adds new ones so later pages never query for them again
+        self._company_cache = {
+            c.prospeo_company_id: c for c in Company.query.filter(
+                Company.job_id == job.id,
+                Company.prospeo_company_id.isnot(None)
+            )
+        }
         
         credits_used = 0
         companies_processed = 0
         companies_skipped = 0
         
         for segment_idx, segment in enumerate(plan["segments"]):
-            if self._stop_requested:
+            if self._stop_event.is_set():
                 break
             
             segment_filters = segment["filters"]
@@ -127,81 +386,148 @@ class MarketSizingJob:
             
             actual_companies_in_segment = 0
             
-            for page in range(1, pages + 1):
-                if self._stop_requested:
-                    break
-                
-                logger.info(f"JOB {job.id}: Requesting page {page}/{pages} of segment {segment_idx + 1}")
-                
-                response = self.client.search_companies(segment_filters, page=page)
-                credits_used += 1
-                
-                if self.client.is_error(response):
-                    logger.warning(f"JOB {job.id}: Page {page} failed: {self.client.get_error_code(response)}")
-                    continue
+            # Up to JOB_PAGE_PREFETCH pages are requested ahead on background threads, so their
+            # requests overlap this page's saves and person searches; pages are processed in order
+            prefetch = max(1, min(Config.JOB_PAGE_PREFETCH, pages))
+            with ThreadPoolExecutor(max_workers=prefetch) as page_fetcher:
+                pending_pages = deque()
+                next_page = 1
+                if pages > 0 and segment.get("first_page") is not None:
+                    # The planner already fetched page 1 while counting this segment
+                    first_page = Future()
+                    first_page.set_result(segment["first_page"])
+                    pending_pages.append(first_page)
+                    next_page = 2
+                while next_page <= pages and len(pending_pages) < prefetch:
+                    pending_pages.append(page_fetcher.submit(self.client.search_companies, segment_filters, page=next_page))
+                    next_page += 1
                 
-                companies_data = self.client.extract_companies(response)
-                page_companies = len(companies_data)
-                actual_companies_in_segment += page_companies
-                
-                logger.info(f"JOB {job.id}: Page {page} returned {page_companies} companies")
-                
-                for company_idx, company_data in enumerate(companies_data):
-                    if self._stop_requested:
+                for page in range(1, pages + 1):
+                    if self._stop_was_requested(job):
+                        for pending in pending_pages:
+                            pending.cancel()
                         break
                     
-                    # Check if company already exists globally
-                    existing_company = None
+                    logger.info(f"JOB {job.id}: Requesting page {page}/{pages} of segment {segment_idx + 1}")
+                    
+                    page_response = pending_pages.popleft()
+                    if next_page <= pages:
+                        pending_pages.append(page_fetcher.submit(self.client.search_companies, segment_filters, page=next_page))
+                        next_page += 1
+                    response = page_response.result()
+                    credits_used += 1
+                    
+                    if self.client.is_error(response):
+                        logger.warning(f"JOB {job.id}: Page {page} failed: {self.client.get_error_code(response)}")
+                        continue
+                    
+                    companies_data = self.client.extract_companies(response)
+                    page_companies = len(companies_data)
+                    actual_companies_in_segment += page_companies
+                    
+                    logger.info(f"JOB {job.id}: Page {page} returned {page_companies} companies")
+                    
+                    # Resolve the whole page before any person searches so the page's new
+                    # companies are inserted in one batched flush rather than one per company
+                    resolved_companies = []
+                    linked_company_ids = set()
+                    
+                    # Companies from any job matching the page's Prospeo ids, loaded in one query
+                    # (oldest first, as the per-company lookup would have found them)
+                    existing_by_prospeo_id = {}
                     if job.skip_existing_companies:
-                        existing_company = self._find_existing_company_globally(company_data)
-                        
-                        if existing_company:
-                            # Link existing company to this job
-                            self._link_existing_company_to_job(existing_company, job.id)
-                            companies_skipped += 1
-                            
-                            if companies_skipped % 50 == 0:
-                                logger.info(f"JOB {job.id}: Skipped {companies_skipped} existing companies so far")
+                        page_prospeo_ids = {c.get("company_id") for c in companies_data if c.get("company_id")}
+                        if page_prospeo_ids:
+                            for existing in Company.query.filter(
+                                Company.prospeo_company_id.in_(page_prospeo_ids)
+                            ).order_by(Company.id):
+                                existing_by_prospeo_id.setdefault(existing.prospeo_company_id, existing)
+                    
+                    with db.session.no_autoflush:
+                        for company_data in companies_data:
+                            # Check if company already exists globally
+                            existing_company = None
+                            if job.skip_existing_companies:
+                                existing_company = self._find_existing_company_globally(company_data, existing_by_prospeo_id)
                             
-                            # Use existing company for person count processing
-                            company = existing_company
-                        else:
-                            # Save new company
-                            company = self._save_company(job.id, company_data)
-                    else:
-                        # Save new company
-                        company = self._save_company(job.id, company_data)
+                            if existing_company:
+                                # Link existing company to this job; links are written for the page below
+                                linked_company_ids.add(existing_company.id)
+                                companies_skipped += 1
+                                
+                                if companies_skipped % 50 == 0:
+                                    logger.info(f"JOB {job.id}: Skipped {companies_skipped} existing companies so far")
+                                
+                                # Use existing company for person count processing
+                                resolved_companies.append(existing_company)
+                            else:
+                                # Save new company
+                                resolved_companies.append(self._save_company(job.id, company_data, self._company_cache))
                     
-                    # Process person counts if needed (for both new and existing companies)
-                    if job.person_filters:
-                        person_credits = self._process_person_counts(job, company)
-                        credits_used += person_credits
+                    self._link_existing_companies_to_job(linked_company_ids, job.id)
+                    db.session.flush()
                     
-                    companies_processed += 1
+                    # Process person counts if needed (for both new and existing companies). Which
+                    # searches to run is decided here; the searches themselves only use the Prospeo
+                    # client, so each company's run on a worker thread and results are written back
+                    # on this thread in page order. The page was just flushed, so the planning
+                    # lookups skip autoflush and its scan of the session's growing identity map
+                    with db.session.no_autoflush:
+                        existing_counts = self._load_existing_person_counts(job, resolved_companies)
+                        related_company_ids = {}
+                        planned_searches = [
+                            (company, self._plan_person_searches(job, company, existing_counts, related_company_ids) if job.person_filters else [])
+                            for company in resolved_companies
+                        ]
                     
-                    # Log progress periodically
-                    if companies_processed % 100 == 0:
-                        logger.info(f"JOB {job.id}: Progress - Processed: {companies_processed}, "
-                                   f"Skipped: {companies_skipped}, Credits: {credits_used}")
-                        
-                        # Log client tracking stats
-                        stats = self.client.get_tracking_stats()
-                        logger.info(f"JOB {job.id}: Client stats - Requests: {stats['total_requests']}, "
-                                   f"Companies collected: {stats['total_companies_collected']}, "
-                                   f"Rate limit delay: {stats['total_rate_limit_delay']:.2f}s")
+                    # Each company's latest result per query (a company can repeat within a page),
+                    # written for the whole page at once below
+                    page_results = {}
                     
-                    job.processed_companies = companies_processed
-                    job.companies_skipped = companies_skipped
-                    job.actual_credits = credits_used
+                    futures = [
+                        self._company_pool.submit(self._run_person_searches, self._company_search_snapshot(company), searches)
+                        for company, searches in planned_searches
+                    ]
                     
-                    if companies_processed % 10 == 0:
-                        db.session.commit()
+                    # Stops are still honoured per company here, since cancelling the pending
+                    # searches saves their credits
+                    for (company, _), future in zip(planned_searches, futures):
+                        if self._stop_event.is_set():
+                            for pending in futures:
+                                pending.cancel()
+                            break
+                        
+                        results_by_query, person_credits, successful_domain = future.result()
+                        if company.successful_domain != successful_domain:
+                            company.successful_domain = successful_domain
+                        page_results.setdefault(company.id, (company, {}))[1].update(results_by_query)
+                        credits_used += person_credits
+                        
+                        companies_processed += 1
+                        
+                        # Log progress periodically
+                        if companies_processed % 100 == 0:
+                            logger.info(f"JOB {job.id}: Progress - Processed: {companies_processed}, "
+                                       f"Skipped: {companies_skipped}, Credits: {credits_used}")
+                            
+                            # Log client tracking stats
+                            stats = self.client.get_tracking_stats()
+                            logger.info(f"JOB {job.id}: Client stats - Requests: {stats['total_requests']}, "
+                                       f"Companies collected: {stats['total_companies_collected']}, "
+                                       f"Rate limit delay: {stats['total_rate_limit_delay']:.2f}s")
+                
+                    # Progress is checkpointed with the page's rows at most once per commit interval
+                    self._save_person_count_results(job, list(page_results.values()))
+                    self._checkpoint_progress(job, companies_processed, companies_skipped, credits_used)
                 
-                db.session.commit()
-            
             logger.info(f"JOB {job.id}: Segment {segment_idx + 1} completed - "
                        f"Expected: {segment['estimated_count']}, Actual: {actual_companies_in_segment}")
         
+        # Commit whatever the last pages left pending (including failed pages' credits)
+        # before the collection summary
+        self._record_progress(job, companies_processed, companies_skipped, credits_used)
+        db.session.commit()
+        
         # Final statistics
         final_stats = self.client.get_tracking_stats()
         logger.info(f"JOB {job.id}: Collection phase completed:")
@@ -219,92 +545,64 @@ class MarketSizingJob:
                 logger.error(f"HubSpot enrichment failed for job {job.id}: {e}")
                 # Continue job processing even if HubSpot enrichment fails completely
 
-    def _save_company(self, job_id, data):
-        """Upsert company - update existing by prospeo_company_id or create new."""
-        domain = data.get("domain") or data.get("website") or ""
-        root = registrable_root_domain(domain)
+    def _save_company(self, job_id, data, job_companies_by_prospeo_id):
+        """Upsert company - update existing by prospeo_company_id or create new.
+        
+        New companies are only added to the session; the caller flushes them as a batch.
+        job_companies_by_prospeo_id maps this job's companies (saved or pending) by Prospeo id.
+        """
         prospeo_id = data.get("company_id")
         
         # Check for existing company with same prospeo_company_id in this job
-        existing = None
-        if prospeo_id:
-            existing = Company.query.filter_by(
-                job_id=job_id, 
-                prospeo_company_id=prospeo_id
-            ).first()
+        existing = job_companies_by_prospeo_id.get(prospeo_id) if prospeo_id else None
         
         if existing:
             # Update existing record with latest data from all Prospeo fields
-            self._update_company_fields(existing, data, root)
-            existing.created_at = datetime.utcnow()  # Update timestamp
-            db.session.flush()
+            self._update_company_fields(existing, data)
             return existing
         
         # Create new company with all Prospeo fields
         company = Company(job_id=job_id, prospeo_company_id=prospeo_id)
-        self._update_company_fields(company, data, root)
+        self._update_company_fields(company, data)
         db.session.add(company)
-        db.session.flush()
+        if prospeo_id:
+            job_companies_by_prospeo_id[prospeo_id] = company
         return company
 
-    def _update_company_fields(self, company, data, root_domain):
-        """Update company object with all fields from Prospeo API response."""
-        company.name = data.get("name") or company.name
-        company.website = data.get("website") or company.website
-        company.domain = data.get("domain") or company.domain
-        company.description = data.get("description") or company.description
-        company.description_seo = data.get("description_seo") or company.description_seo
-        company.description_ai = data.get("description_ai") or company.description_ai
-        company.company_type = data.get("type") or company.company_type
-        company.industry = data.get("industry") or company.industry
-        company.employee_count = data.get("employee_count") or company.employee_count
-        company.employee_range = data.get("employee_range") or company.employee_range
-        company.founded = data.get("founded") or company.founded
-        company.other_websites = data.get("other_websites") or company.other_websites
-        company.keywords = data.get("keywords") or company.keywords
-        company.logo_url = data.get("logo_url") or company.logo_url
-        
-        # Location (flatten nested object)
-        location = data.get("location", {}) if isinstance(data.get("location"), dict) else {}
-        company.location_country = location.get("country") or company.location_country
-        company.location_city = location.get("city") or company.location_city
-        company.location_state = location.get("state") or company.location_state
-        company.location_country_code = location.get("country_code") or company.location_country_code
-        company.location_raw_address = location.get("raw_address") or company.location_raw_address
-        
-        company.email_tech = data.get("email_tech") or company.email_tech
-        company.phone_hq = data.get("phone_hq") or company.phone_hq
-        
-        company.linkedin_url = data.get("linkedin_url") or company.linkedin_url
-        company.twitter_url = data.get("twitter_url") or company.twitter_url
-        company.facebook_url = data.get("facebook_url") or company.facebook_url
-        company.crunchbase_url = data.get("crunchbase_url") or company.crunchbase_url
-        company.instagram_url = data.get("instagram_url") or company.instagram_url
-        company.youtube_url = data.get("youtube_url") or company.youtube_url
-        
-        # Revenue (flatten nested object)
-        revenue_range = data.get("revenue_range", {}) if isinstance(data.get("revenue_range"), dict) else {}
-        company.revenue_min = revenue_range.get("min") or company.revenue_min
-        company.revenue_max = revenue_range.get("max") or company.revenue_max
-        company.revenue_range_printed = data.get("revenue_range_printed") or company.revenue_range_printed
-        
-        # Attributes (flatten nested object)
-        attributes = data.get("attributes", {}) if isinstance(data.get("attributes"), dict) else {}
-        company.is_b2b = attributes.get("is_b2b") if attributes.get("is_b2b") is not None else company.is_b2b
-        company.has_demo = attributes.get("has_demo") if attributes.get("has_demo") is not None else company.has_demo
-        company.has_free_trial = attributes.get("has_free_trial") if attributes.get("has_free_trial") is not None else company.has_free_trial
-        company.has_downloadable = attributes.get("has_downloadable") if attributes.get("has_downloadable") is not None else company.has_downloadable
-        company.has_mobile_apps = attributes.get("has_mobile_apps") if attributes.get("has_mobile_apps") is not None else company.has_mobile_apps
-        company.has_online_reviews = attributes.get("has_online_reviews") if attributes.get("has_online_reviews") is not None else company.has_online_reviews
-        company.has_pricing = attributes.get("has_pricing") if attributes.get("has_pricing") is not None else company.has_pricing
-        
-        company.funding = data.get("funding") or company.funding
-        company.technology = data.get("technology") or company.technology
-        company.job_postings = data.get("job_postings") or company.job_postings
-        
-        company.sic_codes = data.get("sic_codes") or company.sic_codes
-        company.naics_codes = data.get("naics_codes") or company.naics_codes
-        company.linkedin_id = data.get("linkedin_id") or company.linkedin_id
+    def _update_company_fields(self, company, data):
+        """Apply fields from a Prospeo API response, assigning only the values that differ.
+        
+        Unchanged fields are left untouched so a repeat sighting of a company does not
+        dirty the row. Returns the names of the changed fields.
+        """
+        # Nested objects are flattened into columns; each is read from the response once
+        location = data.get("location")
+        if not isinstance(location, dict):
+            location = {}
+        revenue_range = data.get("revenue_range")
+        if not isinstance(revenue_range, dict):
+            revenue_range = {}
+        attributes = data.get("attributes")
+        if not isinstance(attributes, dict):
+            attributes = {}
+        
+        changed = []
+        for source, fields in ((data, COMPANY_FIELDS), (location, COMPANY_LOCATION_FIELDS), (revenue_range, COMPANY_REVENUE_FIELDS)):
+            for name, key in fields:
+                # Empty values in the response keep the current one
+                value = source.get(key)
+                if value and value != getattr(company, name):
+                    setattr(company, name, value)
+                    changed.append(name)
+        
+        # Attributes are booleans, so only a missing value (not False) keeps the current one
+        for name in COMPANY_ATTRIBUTE_FIELDS:
+            value = attributes.get(name)
+            if value is not None and value != getattr(company, name):
+                setattr(company, name, value)
+                changed.append(name)
+        
+        return changed
 
     
     def _prepare_company_search_filters(self, company_filters):
@@ -343,15 +641,18 @@ class MarketSizingJob:
         
         return normalized_filters
     
-    def _find_existing_company_globally(self, company_data):
-        """Find existing company by prospeo_company_id, domain, or name."""
+    def _find_existing_company_globally(self, company_data, companies_by_prospeo_id):
+        """Find existing company by prospeo_company_id, domain, or name.
+        
+        companies_by_prospeo_id holds the page's preloaded matches for the primary lookup.
+        """
         prospeo_id = company_data.get("company_id")
         domain = company_data.get("domain") or company_data.get("website", "")
         name = company_data.get("name", "")
         
         # Primary lookup: by prospeo_company_id
         if prospeo_id:
-            existing = Company.query.filter_by(prospeo_company_id=prospeo_id).first()
+            existing = companies_by_prospeo_id.get(prospeo_id)
             if existing:
                 return existing
         
@@ -378,36 +679,45 @@ class MarketSizingJob:
         
         return None
     
-    def _link_existing_company_to_job(self, company, job_id):
-        """Create a reference linking an existing company to the current job."""
-        # Check if reference already exists
-        existing_ref = CompanyJobReference.query.filter_by(
-            company_id=company.id,
-            job_id=job_id
-        ).first()
+    def _link_existing_companies_to_job(self, company_ids, job_id):
+        """Create references linking existing companies to the current job.
+        
+        One query finds the references that already exist and one batched INSERT adds the rest;
+        nothing reads the new references back, so they are written without ORM objects.
+        """
+        if not company_ids:
+            return
         
-        if not existing_ref:
-            ref = CompanyJobReference(
-                company_id=company.id,
-                job_id=job_id
+        already_linked = {
+            company_id for (company_id,) in db.session.query(CompanyJobReference.company_id).filter(
+                CompanyJobReference.job_id == job_id,
+                CompanyJobReference.company_id.in_(company_ids)
             )
-            db.session.add(ref)
-            db.session.flush()
+        }
+        new_refs = [
+            {"company_id": company_id, "job_id": job_id}
+            for company_id in sorted(company_ids - already_linked)
+        ]
+        if new_refs:
+            db.session.execute(insert(CompanyJobReference), new_refs)
 
-    def _process_person_counts(self, job, company):
-        """Process person counts with domain/website fallback and enhanced filters"""
+    def _plan_person_searches(self, job, company, existing_counts, related_company_ids):
+        """Return the (query_name, filters) person searches a company still needs, skipping fresh existing data.
+        
+        existing_counts and related_company_ids are the page's lookups for _find_existing_person_count.
+        """
         import logging
         logger = logging.getLogger(__name__)
         
-        credits_used = 0
+        searches = []
         person_counts_skipped = 0
         
-        for person_config in job.person_filters:
-            query_name = person_config.get("name", "Unnamed Query")
-            
+        for query_name, filters in self._get_person_search_templates(job):
             # Check for existing person count data
             if job.skip_existing_person_counts:
-                existing_count = self._find_existing_person_count(company, query_name, job.max_data_age_days)
+                existing_count = self._find_existing_person_count(
+                    company, query_name, job.max_data_age_days, existing_counts, related_company_ids
+                )
                 if existing_count and existing_count.status == 'ok':
                     logger.debug(f"Skipping person count for {company.name} - {query_name}: existing successful data found (count: {existing_count.total_count})")
                     person_counts_skipped += 1
@@ -415,108 +725,196 @@ class MarketSizingJob:
                 elif existing_count and existing_count.status != 'ok':
                     logger.info(f"Re-running person count for {company.name} - {query_name}: existing data had error status '{existing_count.status}'")
             
-            # Prepare filters with location resolution
-            filters = self._prepare_person_search_filters(job, person_config)
-            
-            # Check if we already know which domain works for this company
-            result = None
-            successful_domain = None
-            
-            if company.successful_domain:
-                # Use the known successful domain
-                logger.debug(f"Using known successful domain for {company.name}: {company.successful_domain}")
-                result = self._execute_person_search(filters, company.successful_domain, company, query_name)
-                credits_used += 1
-                
-                if result and result.get("total_count", 0) > 0:
-                    successful_domain = company.successful_domain
-                    logger.debug(f"Person search succeeded with known domain for {company.name}: {result['total_count']}")
-                else:
-                    logger.warning(f"Known successful domain {company.successful_domain} failed for {company.name}, falling back to waterfall")
-                    # Clear the failed domain and fall back to waterfall
-                    company.successful_domain = None
-            
-            # If no known successful domain or it failed, run the waterfall
-            if not successful_domain:
-                from services.domain_utils import get_search_domains_priority_order
-                domains_to_try = get_search_domains_priority_order(company)
-                
-                # Try domains in evidence-based priority order (website → domain → other_websites)
-                for i, domain_root in enumerate(domains_to_try):
-                    if not domain_root:
-                        continue
-                        
-                    domain_source = "website" if i == 0 else "domain" if i == 1 else "other_websites"
-                    logger.debug(f"Trying person search for {company.name} - {query_name} with {domain_source}: {domain_root}")
-                    
-                    result = self._execute_person_search(filters, domain_root, company, query_name)
-                    credits_used += 1
-                    
-                    # If we got results, we're done
-                    if result and result.get("total_count", 0) > 0:
-                        successful_domain = domain_root
-                        logger.debug(f"Person search succeeded with {domain_source} for {company.name}: {result['total_count']} (domain: {domain_root})")
-                        
-                        # Save successful domain to company for future use
-                        company.successful_domain = domain_root
-                        logger.debug(f"Saved successful domain {domain_root} to company {company.name}")
-                        break
-                    else:
-                        logger.debug(f"Person search with {domain_source} for {company.name} returned 0 results (domain: {domain_root})")
-            
-            # Save the result (success or final attempt)
-            if result:
-                if successful_domain:
-                    result["successful_domain"] = successful_domain
-                self._save_person_count_result(job, company, query_name, result)
-            else:
-                # No domains available
-                logger.warning(f"No domains available for {company.name}")
-                no_domain_result = {
-                    "total_count": 0,
-                    "status": "error", 
-                    "error_code": "NO_DOMAIN_AVAILABLE"
-                }
-                self._save_person_count_result(job, company, query_name, no_domain_result)
+            searches.append((query_name, filters))
         
         # Update job tracking
         if person_counts_skipped > 0:
             job.person_counts_skipped = (job.person_counts_skipped or 0) + person_counts_skipped
             logger.info(f"JOB {job.id}: Skipped {person_counts_skipped} person count queries (existing data)")
         
-        return credits_used
+        return searches
+    
+    @staticmethod
+    def _company_search_snapshot(company):
+        """Plain copy of the company fields person searches read, safe to hand to a worker thread."""
+        return SimpleNamespace(
+            name=company.name,
+            website=company.website,
+            domain=company.domain,
+            other_websites=company.other_websites,
+            successful_domain=company.successful_domain
+        )
+    
+    def _run_person_searches(self, company, searches):
+        """Run a company's person searches with domain/website fallback.
+        
+        Uses only the Prospeo client (no database session), so it can run on a worker thread;
+        company is a _company_search_snapshot. Returns (results_by_query, credits_used,
+        successful_domain) for the caller to persist.
+        """
+        credits_used = 0
+        results_by_query = {}
+        known_domain = company.successful_domain
+        remaining = list(searches)
+        
+        # Until a working domain is known, queries run one at a time so the first success spares
+        # the rest the waterfall; after that they are independent and run concurrently
+        while remaining and not known_domain:
+            query_name, filters = remaining.pop(0)
+            result, search_credits, known_domain = self._run_person_search(company, query_name, filters, known_domain)
+            results_by_query[query_name] = result
+            credits_used += search_credits
+        
+        if remaining:
+            outcomes = list(self._query_pool.map(
+                lambda search: self._run_person_search(company, search[0], search[1], known_domain),
+                remaining
+            ))
+            
+            for (query_name, _), (result, search_credits, _) in zip(remaining, outcomes):
+                results_by_query[query_name] = result
+                credits_used += search_credits
+            
+            # Keep the latest domain any query confirmed; None if the known one stopped working
+            known_domain = next((domain for _, _, domain in reversed(outcomes) if domain), None)
+        
+        return results_by_query, credits_used, known_domain
+    
+    def _run_person_search(self, company, query_name, filters, known_domain):
+        """Run one query's person search, falling back through the company's domains.
+        
+        Returns (result, credits_used, known_domain), where known_domain is the domain that
+        last returned people, or None once the given one stops working.
+        """
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        credits_used = 0
+        
+        # Check if we already know which domain works for this company
+        result = None
+        successful_domain = None
+        
+        if known_domain:
+            # Use the known successful domain
+            logger.debug(f"Using known successful domain for {company.name}: {known_domain}")
+            result, search_credits = self._cached_person_search(filters, known_domain, company, query_name)
+            credits_used += search_credits
+            
+            if result and result.get("total_count", 0) > 0:
+                successful_domain = known_domain
+                logger.debug(f"Person search succeeded with known domain for {company.name}: {result['total_count']}")
+            else:
+                logger.warning(f"Known successful domain {known_domain} failed for {company.name}, falling back to waterfall")
+                # Clear the failed domain and fall back to waterfall
+                known_domain = None
+        
+        # If no known successful domain or it failed, run the waterfall
+        if not successful_domain:
+            domains_to_try = get_search_domains_priority_order(company)
+            
+            # Try domains in evidence-based priority order (website → domain → other_websites)
+            for i, domain_root in enumerate(domains_to_try):
+                if not domain_root:
+                    continue
+                    
+                domain_source = "website" if i == 0 else "domain" if i == 1 else "other_websites"
+                logger.debug(f"Trying person search for {company.name} - {query_name} with {domain_source}: {domain_root}")
+                
+                result, search_credits = self._cached_person_search(filters, domain_root, company, query_name)
+                credits_used += search_credits
+                
+                # If we got results, we're done
+                if result and result.get("total_count", 0) > 0:
+                    successful_domain = domain_root
+                    logger.debug(f"Person search succeeded with {domain_source} for {company.name}: {result['total_count']} (domain: {domain_root})")
+                    
+                    # Remember successful domain for the company's remaining queries
+                    known_domain = domain_root
+                    break
+                else:
+                    logger.debug(f"Person search with {domain_source} for {company.name} returned 0 results (domain: {domain_root})")
+        
+        # Return the result (success or final attempt)
+        if result:
+            if successful_domain:
+                result["successful_domain"] = successful_domain
+        else:
+            # No domains available
+            logger.warning(f"No domains available for {company.name}")
+            result = {
+                "total_count": 0,
+                "status": "error", 
+                "error_code": "NO_DOMAIN_AVAILABLE"
+            }
+        
+        return result, credits_used, known_domain
+    
+    def _get_person_search_templates(self, job):
+        """Return the job's (query_name, filters) person searches, prepared once per job.
+        
+        The filters are shared by every company, so they must not be mutated per search.
+        """
+        if self._person_search_templates is None:
+            self._person_search_templates = [
+                (person_config.get("name", "Unnamed Query"), self._prepare_person_search_filters(job, person_config))
+                for person_config in (job.person_filters or [])
+            ]
+        return self._person_search_templates
     
     def _prepare_person_search_filters(self, job, person_config):
         """Prepare filters with dynamic location resolution and UI inputs"""
         filters = dict(person_config.get("filters", {}))
         
-        # Handle location formatting via Search Suggestions API
+        # Handle location formatting via Search Suggestions API; the nested filter is
+        # copied so the job's stored person_filters keep the user's input
         if "person_location_search" in filters:
             includes = filters["person_location_search"].get("include", [])
             resolved_includes = []
             for location in includes:
                 resolved = self.client.resolve_location_format(location)
                 resolved_includes.append(resolved)
-            filters["person_location_search"]["include"] = resolved_includes
+            filters["person_location_search"] = dict(filters["person_location_search"], include=resolved_includes)
+        
+        # Normalize the company website filter once, so each search only swaps in its domain
+        company_filters = dict(filters.get("company") or {})
+        company_filters["websites"] = dict(company_filters.get("websites") or {"include": [], "exclude": []})
+        filters["company"] = company_filters
         
         # Note: time_in_role from UI is already handled by the frontend
         # The UI widgets.timeRole.getValues() adds person_time_in_current_role if values provided
         
         return filters
     
+    def _cached_person_search(self, filters, root_domain, company, query_name):
+        """_execute_person_search memoized per job; returns (result, credits_used).
+        
+        Errors are not cached so a later company with the same domain retries the search.
+        """
+        key = (query_name, root_domain)
+        with self._person_search_cache_lock:
+            cached = self._person_search_cache.get(key)
+        if cached is not None:
+            return dict(cached), 0
+        
+        result = self._execute_person_search(filters, root_domain, company, query_name)
+        if result.get("status") == "ok":
+            with self._person_search_cache_lock:
+                self._person_search_cache[key] = dict(result)
+        return result, 1
+    
     def _execute_person_search(self, filters, root_domain, company, query_name):
         """Execute person search with given domain"""
         import logging
         logger = logging.getLogger(__name__)
         
-        # Set up company website filter
-        search_filters = dict(filters)
-        if "company" not in search_filters:
-            search_filters["company"] = {}
-        if "websites" not in search_filters["company"]:
-            search_filters["company"]["websites"] = {"include": [], "exclude": []}
-        
-        search_filters["company"]["websites"]["include"] = [root_domain]
+        # Set up company website filter; only the company/websites path is copied, since
+        # filters is a per-job template shared by searches running on other threads
+        company_filters = filters["company"]
+        search_filters = dict(filters, company=dict(
+            company_filters,
+            websites=dict(company_filters["websites"], include=[root_domain])
+        ))
         
         company_display_name = getattr(company, 'company_name', None) or getattr(company, 'name', 'Unknown')
         logger.debug(f"Executing person search for {company_display_name} - {query_name} with domain: {root_domain}")
@@ -535,60 +933,121 @@ class MarketSizingJob:
         
         return result
     
-    def _save_person_count_result(self, job, company, query_name, result):
-        """Save person count result to database with active record management"""
-        # Set previous records for this company and query to inactive
-        PersonCount.query.filter(
-            PersonCount.company_id == company.id,
-            PersonCount.query_name == query_name,
-            PersonCount.is_active == True
-        ).update({"is_active": False})
-        
-        # Create new active record
-        person_count = PersonCount(
-            company_id=company.id,
-            job_id=job.id,
-            query_name=query_name,
-            total_count=result.get("total_count", 0),
-            status=result.get("status", "ok"),
-            error_code=result.get("error_code"),
-            prospeo_company_id=company.prospeo_company_id,
-            is_active=True  # New record is active by default
+    def _save_person_count_results(self, job, company_results):
+        """Save a page's person count results with active record management.
+        
+        company_results is a list of (company, results_by_query). One UPDATE retires the
+        previous active records and one batched INSERT adds the new ones for the whole page.
+        Both run in a savepoint: if another job running at the same time commits an active
+        record for one of these companies first, the partial unique index rejects the INSERT,
+        and the savepoint is rolled back and retried so the other job's record is retired too.
+        Rows are inserted in (company_id, query_name) order so jobs sharing companies take the
+        index's locks in the same order; a deadlock or serialization failure is retried as well.
+        """
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        rows = sorted(
+            (
+                (company, query_name, result)
+                for company, results_by_query in company_results
+                for query_name, result in results_by_query.items()
+            ),
+            key=lambda row: (row[0].id, row[1])
         )
-        db.session.add(person_count)
+        if not rows:
+            return
+        
+        keys = [(company.id, query_name) for company, query_name, _ in rows]
+        new_records = [
+            {
+                "company_id": company.id,
+                "job_id": job.id,
+                "query_name": query_name,
+                "total_count": result.get("total_count", 0),
+                "status": result.get("status", "ok"),
+                "error_code": result.get("error_code"),
+                "prospeo_company_id": company.prospeo_company_id,
+                "is_active": True  # New record is active by default
+            }
+            for company, query_name, result in rows
+        ]
+        
+        for attempt in range(1, PERSON_COUNT_SAVE_ATTEMPTS + 1):
+            try:
+                with db.session.begin_nested():
+                    # Set previous records for these companies and queries to inactive
+                    PersonCount.query.filter(
+                        tuple_(PersonCount.company_id, PersonCount.query_name).in_(keys),
+                        PersonCount.is_active == True
+                    ).update({"is_active": False}, synchronize_session=False)
+                    
+                    # Create new active records
+                    db.session.execute(insert(PersonCount), new_records)
+                return
+            except (IntegrityError, OperationalError) as e:
+                if attempt == PERSON_COUNT_SAVE_ATTEMPTS or (
+                    isinstance(e, OperationalError) and not _is_transient_lock_conflict(e)
+                ):
+                    raise
+                logger.warning(f"JOB {job.id}: Active person count saved concurrently by another job, retrying page save (attempt {attempt + 1})")
     
-    def _find_existing_person_count(self, company, query_name, max_age_days):
-        """Find existing person count data for a company and query within age limit."""
-        max_age = datetime.utcnow() - timedelta(days=max_age_days)
+    def _load_existing_person_counts(self, job, companies):
+        """Load the fresh active person counts for the companies' Prospeo ids in one query.
+        
+        Returns {(prospeo_company_id, query_name): PersonCount}, keeping the oldest match per key,
+        for _find_existing_person_count's primary lookup.
+        """
+        if not (job.person_filters and job.skip_existing_person_counts):
+            return {}
+        
+        prospeo_ids = {company.prospeo_company_id for company in companies if company.prospeo_company_id}
+        if not prospeo_ids:
+            return {}
+        
+        max_age = datetime.utcnow() - timedelta(days=job.max_data_age_days)
+        existing_counts = {}
+        for person_count in PersonCount.query.filter(
+            PersonCount.prospeo_company_id.in_(prospeo_ids),
+            PersonCount.query_name.in_([query_name for query_name, _ in self._get_person_search_templates(job)]),
+            PersonCount.created_at >= max_age,
+            PersonCount.is_active == True
+        ).order_by(PersonCount.id):
+            existing_counts.setdefault((person_count.prospeo_company_id, person_count.query_name), person_count)
+        return existing_counts
+    
+    def _find_existing_person_count(self, company, query_name, max_age_days, existing_counts, related_company_ids):
+        """Find existing person count data for a company and query within age limit.
         
-        # Look for existing person count by company identifiers
-        existing = None
+        existing_counts is the page's preload from _load_existing_person_counts; related_company_ids
+        memoizes the ids of companies sharing a root domain, so each domain is looked up once per page.
+        """
+        max_age = datetime.utcnow() - timedelta(days=max_age_days)
         
         # Primary: by prospeo_company_id and query name
+        existing = None
         if company.prospeo_company_id:
-            existing = PersonCount.query.filter(
-                PersonCount.prospeo_company_id == company.prospeo_company_id,
-                PersonCount.query_name == query_name,
-                PersonCount.created_at >= max_age,
-                PersonCount.is_active == True
-            ).first()
+            existing = existing_counts.get((company.prospeo_company_id, query_name))
         
         # Secondary: by company domain/website and query name
         if not existing and (company.domain or company.website):
             root_domain = registrable_root_domain(company.domain or company.website or "")
             if root_domain:
                 # Find companies with same domain
-                related_companies = Company.query.filter(
-                    or_(
-                        Company.domain == root_domain,
-                        Company.website == root_domain,
-                        Company.domain.like(f'%{root_domain}'),
-                        Company.website.like(f'%{root_domain}')
-                    )
-                ).all()
+                company_ids = related_company_ids.get(root_domain)
+                if company_ids is None:
+                    company_ids = related_company_ids[root_domain] = [
+                        row.id for row in db.session.query(Company.id).filter(
+                            or_(
+                                Company.domain == root_domain,
+                                Company.website == root_domain,
+                                Company.domain.like(f'%{root_domain}'),
+                                Company.website.like(f'%{root_domain}')
+                            )
+                        )
+                    ]
                 
-                if related_companies:
-                    company_ids = [c.id for c in related_companies]
+                if company_ids:
                     existing = PersonCount.query.filter(
                         PersonCount.company_id.in_(company_ids),
                         PersonCount.query_name == query_name,
@@ -608,24 +1067,30 @@ class MarketSizingJob:
             
             # First, normalize domains for companies missing domain but having website
             logger.info(f"Checking for companies missing domain field...")
-            from services.domain_utils import registrable_root_domain
             
-            companies_missing_domain = Company.query.filter_by(job_id=job.id)\
+            companies_missing_domain = db.session.query(Company.id, Company.name, Company.website)\
+                .filter(Company.job_id == job.id)\
                 .filter(Company.domain.is_(None))\
                 .filter(Company.website.isnot(None))\
                 .all()
             
             if companies_missing_domain:
                 logger.info(f"Found {len(companies_missing_domain)} companies missing domain, normalizing from website field...")
+                domain_updates = []
                 for company in companies_missing_domain:
                     try:
                         normalized_domain = registrable_root_domain(company.website)
                         if normalized_domain:
-                            company.domain = normalized_domain
+                            domain_updates.append({"id": company.id, "domain": normalized_domain})
                             logger.debug(f"Set domain for {company.name}: {normalized_domain} (from {company.website})")
                     except Exception as e:
                         logger.warning(f"Failed to normalize domain for company {company.id} ({company.name}): {e}")
                 
+                # One executemany UPDATE by primary key; bulk updates don't touch loaded objects
+                # and commits don't expire them while the job runs, so they are expired here
+                if domain_updates:
+                    db.session.execute(update(Company), domain_updates)
+                    db.session.expire_all()
                 db.session.commit()
                 logger.info(f"Domain normalization complete.")
             
@@ -652,40 +1117,55 @@ class MarketSizingJob:
             hubspot_skipped = 0
             chunk_size = 500
             
-            for offset in range(0, total_company_count, chunk_size):
+            # Chunks are read by keyset on id, selecting only the columns enrichment uses
+            loaded = 0
+            last_id = 0
+            while loaded < total_company_count:
                 # Load chunk of companies from database
-                logger.info(f"Loading companies {offset+1}-{min(offset+chunk_size, total_company_count)} of {total_company_count}")
+                logger.info(f"Loading companies {loaded+1}-{min(loaded+chunk_size, total_company_count)} of {total_company_count}")
                 
                 try:
-                    company_chunk = Company.query.filter_by(job_id=job.id)\
+                    company_chunk = db.session.query(
+                        Company.id, Company.name, Company.domain, Company.website, Company.linkedin_url
+                    ).filter(Company.job_id == job.id, Company.id > last_id)\
+                        .order_by(Company.id)\
                         .limit(chunk_size)\
-                        .offset(offset)\
                         .all()
                 except Exception as e:
                     logger.error(f"Failed to load companies from database: {e}")
                     raise
                 
-                # Process each company in the chunk
+                if not company_chunk:
+                    break
+                loaded += len(company_chunk)
+                last_id = company_chunk[-1].id
+                
+                # Process each company in the chunk; references to existing enrichments are
+                # inserted together once the chunk is done, so the lookups have nothing to autoflush
+                hubspot_refs = []
                 for company in company_chunk:
                     if job.skip_existing_hubspot:
-                        existing_enrichment = self._find_existing_hubspot_enrichment(company, job.max_data_age_days)
+                        with db.session.no_autoflush:
+                            existing_enrichment = self._find_existing_hubspot_enrichment(company, job.max_data_age_days)
                         if existing_enrichment:
                             logger.debug(f"Skipping HubSpot enrichment for {company.name}: existing data found")
                             
                             # Create reference to existing enrichment for this job
-                            hubspot_ref = HubSpotEnrichment(
-                                company_id=company.id,
-                                job_id=job.id,
-                                hubspot_object_id=existing_enrichment.hubspot_object_id,
-                                vertical=existing_enrichment.vertical,
-                                lookup_method=existing_enrichment.lookup_method,
-                                hubspot_created_date=existing_enrichment.hubspot_created_date
-                            )
-                            db.session.add(hubspot_ref)
+                            hubspot_refs.append({
+                                "company_id": company.id,
+                                "job_id": job.id,
+                                "hubspot_object_id": existing_enrichment.hubspot_object_id,
+                                "vertical": existing_enrichment.vertical,
+                                "lookup_method": existing_enrichment.lookup_method,
+                                "hubspot_created_date": existing_enrichment.hubspot_created_date
+                            })
                             hubspot_skipped += 1
                             continue
                 
                     companies_to_enrich.append(company)
+                
+                if hubspot_refs:
+                    db.session.execute(insert(HubSpotEnrichment), hubspot_refs)
             
             # Update job tracking
             if hubspot_skipped > 0:
@@ -709,7 +1189,7 @@ class MarketSizingJob:
             total_enriched = 0
             
             for i in range(0, len(companies_to_enrich), batch_size):
-                if self._stop_requested:
+                if self._stop_was_requested(job):
                     break
                 
                 batch = companies_to_enrich[i:i + batch_size]
@@ -728,35 +1208,32 @@ class MarketSizingJob:
                 # Get HubSpot enrichments for this batch
                 enrichments = self.hubspot_client.batch_enrich_companies(batch_data)
                 
-                # Save enrichment results to database with active record management
-                for company_id, enrichment_data in enrichments.items():
-                    if enrichment_data:
-                        # Set previous HubSpot enrichments for this company to inactive
-                        # Use explicit session and flush to ensure deactivation happens before new record
-                        deactivate_count = HubSpotEnrichment.query.filter(
-                            HubSpotEnrichment.company_id == company_id,
-                            HubSpotEnrichment.is_active == True
-                        ).update({"is_active": False})
-                        
-                        # Flush the deactivation to ensure it's applied before creating new record
-                        db.session.flush()
-                        
-                        # Create new active enrichment record
-                        hubspot_enrichment = HubSpotEnrichment(
-                            company_id=company_id,
-                            job_id=job.id,
-                            hubspot_object_id=enrichment_data['hubspot_object_id'],
-                            vertical=enrichment_data['vertical'],
-                            lookup_method=enrichment_data['lookup_method'],
-                            hubspot_created_date=enrichment_data['hubspot_created_date'],
-                            is_active=True  # New record is active by default
-                        )
-                        db.session.add(hubspot_enrichment)
-                        total_enriched += 1
-                        
-                        # Log if we deactivated existing records for debugging
-                        if deactivate_count > 0:
-                            logger.debug(f"Deactivated {deactivate_count} existing HubSpot enrichments for company {company_id}")
+                # Save enrichment results to database with active record management: one UPDATE
+                # retires the batch's previous active enrichments, then one INSERT adds the new ones
+                enrichment_rows = [
+                    {
+                        "company_id": company_id,
+                        "job_id": job.id,
+                        "hubspot_object_id": enrichment_data['hubspot_object_id'],
+                        "vertical": enrichment_data['vertical'],
+                        "lookup_method": enrichment_data['lookup_method'],
+                        "hubspot_created_date": enrichment_data['hubspot_created_date'],
+                        "is_active": True
+                    }
+                    for company_id, enrichment_data in enrichments.items()
+                    if enrichment_data
+                ]
+                if enrichment_rows:
+                    deactivate_count = HubSpotEnrichment.query.filter(
+                        HubSpotEnrichment.company_id.in_([row["company_id"] for row in enrichment_rows]),
+                        HubSpotEnrichment.is_active == True
+                    ).update({"is_active": False}, synchronize_session=False)
+                    db.session.execute(insert(HubSpotEnrichment), enrichment_rows)
+                    total_enriched += len(enrichment_rows)
+                    
+                    # Log if we deactivated existing records for debugging
+                    if deactivate_count > 0:
+                        logger.debug(f"Deactivated {deactivate_count} existing HubSpot enrichments for {len(enrichment_rows)} companies")
                 
                 # Commit batch results
                 db.session.commit()
@@ -769,7 +1246,10 @@ class MarketSizingJob:
             # Continue job processing even if HubSpot enrichment fails
     
     def _find_existing_hubspot_enrichment(self, company, max_age_days):
-        """Find existing HubSpot enrichment data for a company within age limit."""
+        """Find existing HubSpot enrichment data for a company within age limit.
+        
+        company only needs id, domain and website, so a column row works as well as a Company.
+        """
         max_age = datetime.utcnow() - timedelta(days=max_age_days)
         
         # Look for existing enrichment by company identifiers
@@ -791,17 +1271,18 @@ class MarketSizingJob:
             root_domain = registrable_root_domain(company.domain or company.website or "")
             if root_domain:
                 # Find companies with same domain that have HubSpot enrichment
-                related_companies = Company.query.filter(
-                    or_(
-                        Company.domain == root_domain,
-                        Company.website == root_domain,
-                        Company.domain.like(f'%{root_domain}'),
-                        Company.website.like(f'%{root_domain}')
+                company_ids = [
+                    row.id for row in db.session.query(Company.id).filter(
+                        or_(
+                            Company.domain == root_domain,
+                            Company.website == root_domain,
+                            Company.domain.like(f'%{root_domain}'),
+                            Company.website.like(f'%{root_domain}')
+                        )
                     )
-                ).all()
+                ]
                 
-                if related_companies:
-                    company_ids = [c.id for c in related_companies]
+                if company_ids:
                     existing = HubSpotEnrichment.query.filter(
                         HubSpotEnrichment.company_id.in_(company_ids),
                         HubSpotEnrichment.created_at >= max_age,
@@ -816,107 +1297,155 @@ class MarketSizingJob:
         import logging
         logger = logging.getLogger(__name__)
         
-        # Get CSV companies for this job
-        csv_companies = CsvCompany.query.filter_by(job_id=job.id).all()
+        # Count CSV companies for this job; the rows themselves are streamed in batches
+        total_csv_companies = CsvCompany.query.filter_by(job_id=job.id).count()
         
-        if not csv_companies:
+        if not total_csv_companies:
             job.error_message = "No CSV companies found for this job"
             logger.error(f"JOB {job.id}: {job.error_message}")
             return
         
-        logger.info(f"JOB {job.id}: Processing {len(csv_companies)} CSV companies")
+        logger.info(f"JOB {job.id}: Processing {total_csv_companies} CSV companies")
         
         credits_used = 0
         companies_processed = 0
         person_counts_skipped = 0
         
-        for csv_company in csv_companies:
-            if self._stop_requested:
+        for csv_companies in self._iter_csv_company_batches(job):
+            if self._stop_was_requested(job):
                 break
             
-            logger.info(f"JOB {job.id}: Processing CSV company {csv_company.company_name or csv_company.domain} (HubSpot ID: {csv_company.hubspot_object_id})")
-            
-            # Process person counts for each persona
-            if job.person_filters:
-                person_credits = self._process_csv_person_counts(job, csv_company)
-                credits_used += person_credits
-            
-            # Create HubSpot enrichment from cache data (only if hubspot_object_id present)
-            if csv_company.hubspot_object_id:
-                self._create_csv_hubspot_enrichment(job, csv_company)
-            
-            companies_processed += 1
+            # Plan the whole batch first, submitting each company's searches to the query pool
+            # as it is planned, so the batch's searches run together; workers get plain values
+            # rather than the ORM rows, which are bound to this thread's session
+            planned = []
+            # When existing counts are reused, a domain repeated within the batch shares the first
+            # company's search, as it would have found that company's saved count
+            batch_searches = {}
+            for csv_company in csv_companies:
+                logger.info(f"JOB {job.id}: Processing CSV company {csv_company.company_name or csv_company.domain} (HubSpot ID: {csv_company.hubspot_object_id})")
+                
+                person_count_rows, searches = self._plan_csv_person_counts(job, csv_company) if job.person_filters else ([], [])
+                snapshot = SimpleNamespace(company_name=csv_company.company_name)
+                futures = []
+                for query_name, filters in searches:
+                    key = (csv_company.domain, query_name)
+                    future = batch_searches.get(key)
+                    reused = future is not None
+                    if not reused:
+                        future = self._query_pool.submit(self._execute_person_search, filters, csv_company.domain, snapshot, query_name)
+                        if job.skip_existing_person_counts and csv_company.domain:
+                            batch_searches[key] = future
+                    futures.append((future, reused))
+                planned.append((csv_company, person_count_rows, searches, futures))
             
-            # Log progress periodically
-            if companies_processed % 10 == 0:
-                logger.info(f"JOB {job.id}: Progress - Processed: {companies_processed}/{len(csv_companies)}, Credits: {credits_used}")
+            # Collect results in order; the batch's PersonCount rows are written with one INSERT
+            batch_person_count_rows = []
+            for csv_company, person_count_rows, searches, futures in planned:
+                if self._stop_was_requested(job):
+                    for _, _, _, pending in planned:
+                        for future, _ in pending:
+                            future.cancel()
+                    break
                 
-                job.processed_companies = companies_processed
-                job.actual_credits = credits_used
-                db.session.commit()
+                for (query_name, _), (future, reused) in zip(searches, futures):
+                    result = future.result()
+                    if result:
+                        # Only a successful shared search counts as a reused count; a failed one is
+                        # copied through as the API call it was, so retries still pick it up
+                        reused_count = reused and result.get("status", "ok") == "ok"
+                        person_count_rows.append({
+                            "csv_company_id": csv_company.id,
+                            "job_id": job.id,
+                            "query_name": query_name,
+                            "total_count": result.get("total_count", 0),
+                            "status": result.get("status", "ok"),
+                            "error_code": result.get("error_code"),
+                            "is_active": True,
+                            "data_source": 'existing_reuse' if reused_count else 'api_call'
+                        })
+                    if not reused:
+                        credits_used += 1
+                batch_person_count_rows.extend(person_count_rows)
+                
+                # Create HubSpot enrichment from cache data (only if hubspot_object_id present)
+                if csv_company.hubspot_object_id:
+                    self._create_csv_hubspot_enrichment(job, csv_company)
+                
+                companies_processed += 1
+                
+                # Log progress periodically
+                if companies_processed % 10 == 0:
+                    logger.info(f"JOB {job.id}: Progress - Processed: {companies_processed}/{total_csv_companies}, Credits: {credits_used}")
+            
+            if batch_person_count_rows:
+                db.session.execute(insert(PersonCount), batch_person_count_rows)
+            self._checkpoint_progress(job, companies_processed, None, credits_used)
         
         # Final update
-        job.processed_companies = companies_processed
-        job.actual_credits = credits_used
+        self._record_progress(job, companies_processed, None, credits_used)
         db.session.commit()
         
         logger.info(f"JOB {job.id}: CSV upload job completed - Processed: {companies_processed}, Credits: {credits_used}")
 
-    def _process_csv_person_counts(self, job, csv_company):
-        """Process person counts for CSV company with deduplication."""
+    def _iter_csv_company_batches(self, job):
+        """Yield the job's CSV companies in id order, in lists of up to CSV_COMPANY_BATCH_SIZE rows.
+        
+        Keyset pagination keeps only one batch in memory and survives the commits made
+        while the batch is processed.
+        """
+        last_id = 0
+        while True:
+            batch = CsvCompany.query.filter(
+                CsvCompany.job_id == job.id,
+                CsvCompany.id > last_id
+            ).order_by(CsvCompany.id).limit(CSV_COMPANY_BATCH_SIZE).all()
+            if not batch:
+                return
+            
+            last_id = batch[-1].id
+            yield batch
+
+    def _plan_csv_person_counts(self, job, csv_company):
+        """Plan person counts for CSV company with deduplication.
+        
+        Returns (person_count_rows, searches): rows reusing fresh existing counts, and the
+        (query_name, filters) searches still to run, which cost one credit each.
+        """
         import logging
         logger = logging.getLogger(__name__)
         
-        credits_used = 0
         person_counts_skipped = 0
+        person_count_rows = []
+        searches = []
         
-        for person_config in job.person_filters:
-            query_name = person_config.get("name", "Unnamed Query")
-            
+        for query_name, filters in self._get_person_search_templates(job):
             # Check for existing person count data by domain
             if job.skip_existing_person_counts:
                 existing_count = self._find_existing_person_count_by_domain(csv_company.domain, query_name, job.max_data_age_days)
                 if existing_count and existing_count.status == 'ok':
                     logger.debug(f"Skipping person count for {csv_company.company_name} - {query_name}: existing data found (count: {existing_count.total_count})")
                     
-                    # Create new PersonCount linked to csv_company but copy existing data
-                    person_count = PersonCount(
-                        csv_company_id=csv_company.id,
-                        job_id=job.id,
-                        query_name=query_name,
-                        total_count=existing_count.total_count,
-                        status=existing_count.status,
-                        error_code=existing_count.error_code,
-                        is_active=True,
-                        data_source='existing_reuse'
-                    )
-                    db.session.add(person_count)
+                    # New PersonCount linked to csv_company but copying existing data
+                    person_count_rows.append({
+                        "csv_company_id": csv_company.id,
+                        "job_id": job.id,
+                        "query_name": query_name,
+                        "total_count": existing_count.total_count,
+                        "status": existing_count.status,
+                        "error_code": existing_count.error_code,
+                        "is_active": True,
+                        "data_source": 'existing_reuse'
+                    })
                     person_counts_skipped += 1
                     continue
             
-            # Run new person search
-            filters = self._prepare_person_search_filters(job, person_config)
-            result = self._execute_person_search(filters, csv_company.domain, csv_company, query_name)
-            credits_used += 1
-            
-            # Save result linked to csv_company
-            if result:
-                person_count = PersonCount(
-                    csv_company_id=csv_company.id,
-                    job_id=job.id,
-                    query_name=query_name,
-                    total_count=result.get("total_count", 0),
-                    status=result.get("status", "ok"),
-                    error_code=result.get("error_code"),
-                    is_active=True,
-                    data_source='api_call'
-                )
-                db.session.add(person_count)
+            searches.append((query_name, filters))
         
         if person_counts_skipped > 0:
             logger.info(f"JOB {job.id}: Skipped {person_counts_skipped} person count queries for {csv_company.company_name} (existing data)")
         
-        return credits_used
+        return person_count_rows, searches
 
     def _create_csv_hubspot_enrichment(self, job, csv_company):
         """Create HubSpot enrichment for CSV company using cache data."""
@@ -924,21 +1453,19 @@ class MarketSizingJob:
         cache_record = HubSpotCache.query.filter_by(hubspot_object_id=csv_company.hubspot_object_id).first()
         
         if cache_record:
-            # Create HubSpot enrichment linked to csv_company
-            enrichment = HubSpotEnrichment(
-                csv_company_id=csv_company.id,
-                job_id=job.id,
-                hubspot_object_id=csv_company.hubspot_object_id,
-                vertical=cache_record.vertical,
-                lookup_method='csv_upload',  # Special method for CSV uploads
-                hubspot_created_date=cache_record.hubspot_created_date,
-                is_active=True
-            )
-            db.session.add(enrichment)
+            # Create HubSpot enrichment linked to csv_company (write-only, so no ORM object)
+            db.session.execute(insert(HubSpotEnrichment), [{
+                "csv_company_id": csv_company.id,
+                "job_id": job.id,
+                "hubspot_object_id": csv_company.hubspot_object_id,
+                "vertical": cache_record.vertical,
+                "lookup_method": 'csv_upload',  # Special method for CSV uploads
+                "hubspot_created_date": cache_record.hubspot_created_date,
+                "is_active": True
+            }])
 
     def _find_existing_person_count_by_domain(self, domain, query_name, max_age_days):
         """Find existing person count by domain across all companies."""
-        from datetime import datetime, timedelta
         max_age = datetime.utcnow() - timedelta(days=max_age_days)
         
         root_domain = registrable_root_domain(domain)
@@ -961,9 +1488,22 @@ class MarketSizingJob:
         return existing
 
 
-def start_job_async(job_id, app):
-    job_runner = MarketSizingJob(job_id)
-    thread = threading.Thread(target=job_runner.run, args=(app,))
+# Runner threads share their web worker's GIL and connection pool with request handlers,
+# so only MAX_CONCURRENT_JOBS execute at once; the rest wait here as 'pending'.
+# Quick TAM jobs take their slots from a separate pool so they never queue behind long jobs.
+_job_slots = threading.BoundedSemaphore(Config.MAX_CONCURRENT_JOBS)
+_quick_tam_slots = threading.BoundedSemaphore(Config.MAX_CONCURRENT_QUICK_TAM_JOBS)
+
+
+def _run_job(job_runner, app, slots):
+    with slots:
+        job_runner.run(app)
+
+
+def start_job_async(job_id, app, on_finish=None, mode=None):
+    job_runner = MarketSizingJob(job_id, on_finish=on_finish)
+    slots = _quick_tam_slots if mode == 'quick_tam' else _job_slots
+    thread = threading.Thread(target=_run_job, args=(job_runner, app, slots))
     thread.daemon = True
     thread.start()
     return job_runner
@@ -48,6 +48,9 @@ class Job(db.Model):
     companies = db.relationship('Company', backref='job', lazy='dynamic')
     company_references = db.relationship('CompanyJobReference', backref='job', lazy='dynamic')
     
+    # Composite index for existing-job lookups by fingerprint and status
+    __table_args__ = (db.Index('ix_jobs_fingerprint_status', 'query_fingerprint', 'status'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -153,6 +156,13 @@ class Company(db.Model):
     person_counts = db.relationship('PersonCount', backref='company', lazy='dynamic')
     hubspot_enrichments = db.relationship('HubSpotEnrichment', backref='company', lazy='dynamic')
     
+    # Composite indexes for keyset pagination of a job's companies and the runner's
+    # load of the companies a job already saved, keyed by Prospeo id
+    __table_args__ = (
+        db.Index('idx_companies_job_id_id', 'job_id', 'id'),
+        db.Index('ix_companies_job_id_prospeo_company_id', 'job_id', 'prospeo_company_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -220,6 +230,17 @@ class PersonCount(db.Model):
     data_source = db.Column(db.String(20), default='api_call')  # 'api_call' or 'existing_reuse'
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
     
+    # Per-job aggregation grouped by query name; at most one active row per company and query
+    __table_args__ = (
+        db.Index('ix_person_counts_job_id_query_name', 'job_id', 'query_name'),
+        db.Index(
+            'ux_person_counts_active_company_query', 'company_id', 'query_name',
+            unique=True,
+            postgresql_where=db.text('is_active AND company_id IS NOT NULL'),
+            sqlite_where=db.text('is_active AND company_id IS NOT NULL')
+        ),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -248,6 +269,9 @@ class HubSpotEnrichment(db.Model):
     hubspot_created_date = db.Column(db.DateTime)  # For duplicate resolution
     is_active = db.Column(db.Boolean, default=True, index=True)  # Active record tracking
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    
+    # Per-job enrichment lookups
+    __table_args__ = (db.Index('ix_hubspot_enrichments_job_id', 'job_id'),)
 
 
 class HubSpotCache(db.Model):
@@ -325,6 +349,9 @@ class CsvCompany(db.Model):
     person_counts = db.relationship('PersonCount', backref='csv_company', lazy='dynamic')
     hubspot_enrichments = db.relationship('HubSpotEnrichment', backref='csv_company', lazy='dynamic')
     
+    # Keyset iteration over a job's uploaded companies
+    __table_args__ = (db.Index('ix_csv_companies_job_id_id', 'job_id', 'id'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -3,6 +3,8 @@ import os
 import sys
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import requests
 
@@ -21,15 +23,20 @@ MAX_PER_SECOND = 30
 MAX_PER_MINUTE = 1800
 MIN_INTERVAL = max(1.0 / MAX_PER_SECOND, 60.0 / MAX_PER_MINUTE)
 _last_request_ts = 0.0
+_rate_limit_lock = threading.Lock()
+
+# Companies whose person searches run at once; requests are still spaced by rate_limit_wait
+MAX_WORKERS = 8
 
 
 def rate_limit_wait():
     global _last_request_ts
-    now = time.time()
-    elapsed = now - _last_request_ts
-    if elapsed < MIN_INTERVAL:
-        time.sleep(MIN_INTERVAL - elapsed)
-    _last_request_ts = time.time()
+    with _rate_limit_lock:
+        now = time.time()
+        elapsed = now - _last_request_ts
+        if elapsed < MIN_INTERVAL:
+            time.sleep(MIN_INTERVAL - elapsed)
+        _last_request_ts = time.time()
 
 
 def safe_json(r):
@@ -169,6 +176,53 @@ def search_people_for_company(root_domain):
     return len(resp.get("results") or []), "ok"
 
 
+def count_company(c):
+    """Run the SDR person search waterfall for one company and return its output row."""
+    name = c.get("name") or "not found"
+    company_id = c.get("company_id") or "not found"
+    website = c.get("website") or "not found"
+
+    # Get domains to try in evidence-based priority order
+    domains_to_try = get_search_domains_priority_order(c)
+
+    if not domains_to_try:
+        return {
+            "company": name,
+            "company_id": company_id,
+            "website": website,
+            "root_domain_used": "not found",
+            "sales_dev_count_entry_or_senior": "not found",
+            "status": "no domain"
+        }
+
+    # Try domains in evidence-based priority order (website → domain → other_websites)
+    count = "not found"
+    status = "error"
+    successful_domain = None
+
+    for i, domain_root in enumerate(domains_to_try):
+        domain_source = "website" if i == 0 else "domain" if i == 1 else "other_websites"
+        print(f"Trying {domain_source} for {name}: {domain_root}", file=sys.stderr)
+        
+        count, status = search_people_for_company(domain_root)
+        
+        if status == "ok" and isinstance(count, int) and count > 0:
+            successful_domain = domain_root
+            print(f"Success with {domain_source} for {name}: {count}", file=sys.stderr)
+            break
+        else:
+            print(f"No results with {domain_source} for {name}: {count}", file=sys.stderr)
+
+    return {
+        "company": name,
+        "company_id": company_id,
+        "website": website,
+        "root_domain_used": successful_domain or domains_to_try[0] if domains_to_try else "not found",
+        "sales_dev_count_entry_or_senior": count,
+        "status": status
+    }
+
+
 def main():
     company_resp = search_companies()
 
@@ -185,53 +239,9 @@ def main():
 
     companies = extract_companies(company_resp)[:25]
 
-    output = []
-
-    for c in companies:
-        name = c.get("name") or "not found"
-        company_id = c.get("company_id") or "not found"
-        website = c.get("website") or "not found"
-
-        # Get domains to try in evidence-based priority order
-        domains_to_try = get_search_domains_priority_order(c)
-
-        if not domains_to_try:
-            output.append({
-                "company": name,
-                "company_id": company_id,
-                "website": website,
-                "root_domain_used": "not found",
-                "sales_dev_count_entry_or_senior": "not found",
-                "status": "no domain"
-            })
-            continue
-
-        # Try domains in evidence-based priority order (website → domain → other_websites)
-        count = "not found"
-        status = "error"
-        successful_domain = None
-
-        for i, domain_root in enumerate(domains_to_try):
-            domain_source = "website" if i == 0 else "domain" if i == 1 else "other_websites"
-            print(f"Trying {domain_source} for {name}: {domain_root}", file=sys.stderr)
-            
-            count, status = search_people_for_company(domain_root)
-            
-            if status == "ok" and isinstance(count, int) and count > 0:
-                successful_domain = domain_root
-                print(f"Success with {domain_source} for {name}: {count}", file=sys.stderr)
-                break
-            else:
-                print(f"No results with {domain_source} for {name}: {count}", file=sys.stderr)
-
-        output.append({
-            "company": name,
-            "company_id": company_id,
-            "website": website,
-            "root_domain_used": successful_domain or domains_to_try[0] if domains_to_try else "not found",
-            "sales_dev_count_entry_or_senior": count,
-            "status": status
-        })
+    # Companies are independent, so their domain waterfalls run concurrently; map keeps their order
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        output = list(pool.map(count_company, companies))
 
     print(json.dumps(output, indent=2))
 
@@ -35,6 +35,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Retried records are written in one commit per this many, so their new PersonCount rows
+# are inserted together instead of one INSERT and commit each
+COMMIT_BATCH_SIZE = 50
+
 def get_failed_person_counts(session, job_id=None, max_age_days=30):
     """
     Query database for person_counts that need retry:
@@ -129,7 +133,8 @@ def execute_person_search_with_domain(client, filters, domain_root, company_name
 
 def retry_person_count(session, client, person_count_record, dry_run=False):
     """
-    Retry person count search for a single record using evidence-based priority waterfall
+    Retry person count search for a single record using evidence-based priority waterfall.
+    Changes are left in the session; the caller commits them in batches.
     """
     # Get the associated company
     company = session.query(Company).filter_by(id=person_count_record.company_id).first()
@@ -216,9 +221,7 @@ def retry_person_count(session, client, person_count_record, dry_run=False):
             is_active=True
         )
         
-            
         session.add(new_person_count)
-        session.commit()
         
         logger.info(f"✅ Updated database for {company.name} - {person_count_record.query_name}: {result['total_count']} people")
     else:
@@ -273,7 +276,10 @@ def main():
                 logger.info(f"\n--- Processing record {i}/{len(records_to_process)} ---")
                 
                 try:
-                    if retry_person_count(session, client, record, args.dry_run):
+                    # Savepoint per record, so a failure only rolls back this record's changes
+                    with session.begin_nested():
+                        retried = retry_person_count(session, client, record, args.dry_run)
+                    if retried:
                         success_count += 1
                     else:
                         failed_count += 1
@@ -281,11 +287,17 @@ def main():
                 except Exception as e:
                     logger.error(f"Error processing record {record.id}: {str(e)}")
                     failed_count += 1
+                
+                if not args.dry_run and i % COMMIT_BATCH_SIZE == 0:
+                    session.commit()
                     
                 # Rate limiting - respect Prospeo limits
                 if i < len(records_to_process):  # Don't sleep after last record
                     time.sleep(0.1)  # Small delay between requests
             
+            if not args.dry_run:
+                session.commit()
+            
             # Summary
             logger.info(f"\n🎯 Retry Summary:")
             logger.info(f"   Total records processed: {len(records_to_process)}")
@@ -301,6 +313,9 @@ def main():
             
         except KeyboardInterrupt:
             logger.info("\n⚠️  Script interrupted by user")
+            # Keep the retries completed before the interrupt
+            if not args.dry_run:
+                session.commit()
         except Exception as e:
             logger.error(f"❌ Script failed: {str(e)}")
             raise
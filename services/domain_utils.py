@@ -1,4 +1,5 @@
 import tldextract
+from functools import lru_cache
 from urllib.parse import urlparse
 
 def hostname_from_url(url):
@@ -14,6 +15,9 @@ def hostname_from_url(url):
         host = host[4:]
     return host
 
+# The same sites recur across pages, jobs and person search waterfalls, and the
+# suffix-list lookup is pure, so results are shared process-wide
+@lru_cache(maxsize=8192)
 def registrable_root_domain(url):
     if not url:
         return ""
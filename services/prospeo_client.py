@@ -1,9 +1,26 @@
 import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
-import json
+import orjson
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
 
+# Successful page-1 search responses shared across client instances, so a Quick TAM
+# job started right after a preview reuses the preview's results: {key: (timestamp, response)}
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+# Prospeo rate limits are per account, so request spacing is shared by every client
+# instance (the app's client and each job runner's) and by all threads using them
+_rate_limit_lock = threading.Lock()
+_last_request_ts = 0.0
+# Set from a 429's retry-after; every thread waits it out, not just the one that was throttled
+_paused_until = 0.0
+
 class ProspeoClient:
     def __init__(self):
         self.base_url = Config.PROSPEO_BASE_URL
@@ -16,8 +33,8 @@ class ProspeoClient:
             1.0 / Config.PROSPEO_MAX_PER_SECOND,
             60.0 / Config.PROSPEO_MAX_PER_MINUTE
         )
-        self._last_request_ts = 0.0
         self.timeout = 30
+        self.session = self._build_session()
         self.logger = logging.getLogger(f"{__name__}.ProspeoClient")
         
         # Tracking metrics
@@ -29,20 +46,58 @@ class ProspeoClient:
         # Location format caching for Search Suggestions API
         self._location_format_cache = {}
         self._current_per_second = None
+        # Responses arrive on many search threads; this keeps the header-driven rate
+        # update (compare, then set both fields) atomic
+        self._rate_update_lock = threading.Lock()
+
+    def _build_session(self):
+        """Keep-alive session so repeated searches reuse pooled TCP/TLS connections."""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        
+        # Only retry gateway errors here; 429s are handled in _post using retry-after
+        retries = Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retries)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
 
     def _rate_limit_wait(self):
-        now = time.time()
-        elapsed = now - self._last_request_ts
-        if elapsed < self.min_interval:
-            delay_time = self.min_interval - elapsed
-            self.logger.debug(f"Rate limit wait: {delay_time:.3f}s")
-            self._total_rate_limit_delay += delay_time
-            time.sleep(delay_time)
-        self._last_request_ts = time.time()
+        """Space requests by min_interval across all clients and return this request's sequence number."""
+        global _last_request_ts
+        with _rate_limit_lock:
+            now = time.time()
+            if now < _paused_until:
+                pause = _paused_until - now
+                self.logger.debug(f"Rate limit pause: {pause:.3f}s")
+                self._total_rate_limit_delay += pause
+                time.sleep(pause)
+                now = time.time()
+            elapsed = now - _last_request_ts
+            if elapsed < self.min_interval:
+                delay_time = self.min_interval - elapsed
+                self.logger.debug(f"Rate limit wait: {delay_time:.3f}s")
+                self._total_rate_limit_delay += delay_time
+                time.sleep(delay_time)
+            _last_request_ts = time.time()
+            self._request_count += 1
+            return self._request_count
+
+    def _pause_requests(self, seconds):
+        """Hold every client's next request until seconds from now (extends, never shortens, a pause)."""
+        global _paused_until
+        with _rate_limit_lock:
+            _paused_until = max(_paused_until, time.time() + seconds)
 
     def _safe_json(self, response):
         try:
-            data = response.json()
+            data = orjson.loads(response.content)
             # Ensure we always return a dictionary object
             if not isinstance(data, dict):
                 return {
@@ -70,19 +125,19 @@ class ProspeoClient:
 
     def _post(self, path, payload, retry_count=0):
         """Enhanced _post with 429 handling and dynamic rate limiting"""
-        self._rate_limit_wait()
-        self._request_count += 1
+        request_number = self._rate_limit_wait()
         
         url = f"{self.base_url}{path}"
         start_time = time.time()
         
-        self.logger.info(f"Prospeo API Request #{self._request_count}: {path}")
-        self.logger.debug(f"Request payload: {json.dumps(payload, indent=2)}")
+        self.logger.info(f"Prospeo API Request #{request_number}: {path}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Request payload: {orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()}")
         
-        response = requests.post(
+        # Content-Type is set on the session, so the orjson-encoded body is sent as-is
+        response = self.session.post(
             url,
-            headers=self.headers,
-            json=payload,
+            data=orjson.dumps(payload),
             timeout=self.timeout
         )
         
@@ -97,7 +152,9 @@ class ProspeoClient:
                     retry_after = 60  # Safe fallback
                 
                 self.logger.warning(f"Rate limit exceeded, waiting {retry_after}s (retry {retry_count + 1})")
-                time.sleep(retry_after)
+                # The limit is per account, so other threads' requests would be throttled too;
+                # the retry waits out the pause in _rate_limit_wait along with them
+                self._pause_requests(retry_after)
                 return self._post(path, payload, retry_count + 1)
             else:
                 self.logger.error("Max retries reached for rate limit")
@@ -116,7 +173,7 @@ class ProspeoClient:
         data["_request_duration"] = request_duration
         
         # Log response summary
-        self.logger.info(f"Prospeo API Response #{self._request_count}: HTTP {response.status_code}, Duration: {request_duration:.3f}s")
+        self.logger.info(f"Prospeo API Response #{request_number}: HTTP {response.status_code}, Duration: {request_duration:.3f}s")
         
         if "pagination" in data:
             pagination = data["pagination"]
@@ -129,20 +186,57 @@ class ProspeoClient:
         
         return data
 
-    def search_companies(self, filters, page=1):
+    def _cached_post(self, path, payload):
+        """_post with a short-TTL memo of successful responses; hits are marked with _cached."""
+        key = (path, orjson.dumps(payload, option=orjson.OPT_SORT_KEYS))
+        
+        with _search_cache_lock:
+            entry = _search_cache.get(key)
+            if entry and time.time() - entry[0] < Config.PROSPEO_SEARCH_CACHE_TTL_SECONDS:
+                _search_cache.move_to_end(key)
+                self.logger.debug(f"Search cache hit: {path}")
+                return dict(entry[1], _cached=True)
+        
+        data = self._post(path, payload)
+        
+        # Errors are never cached so a retry always reaches the API
+        if not self.is_error(data):
+            with _search_cache_lock:
+                _search_cache[key] = (time.time(), data)
+                _search_cache.move_to_end(key)
+                while len(_search_cache) > Config.PROSPEO_SEARCH_CACHE_MAX_ENTRIES:
+                    _search_cache.popitem(last=False)
+        
+        return data
+
+    def search_companies(self, filters, page=1, cached=False):
         payload = {
             "page": page,
             "filters": filters
         }
+        if cached:
+            return self._cached_post("/search-company", payload)
         return self._post("/search-company", payload)
 
-    def search_people(self, filters, page=1):
+    def search_people(self, filters, page=1, cached=False):
         payload = {
             "page": page,
             "filters": filters
         }
+        if cached:
+            return self._cached_post("/search-person", payload)
         return self._post("/search-person", payload)
 
+    def search_people_many(self, filters_list, page=1, cached=False):
+        """Run independent person searches concurrently; responses are returned in input order."""
+        if not filters_list:
+            return []
+        
+        # Requests still pass through the shared rate limiter in _post
+        max_workers = min(Config.PROSPEO_MAX_CONCURRENT_REQUESTS, len(filters_list))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda filters: self.search_people(filters, page=page, cached=cached), filters_list))
+
     def extract_companies(self, response):
         rows = response.get("results") or []
         companies = []
@@ -169,13 +263,18 @@ class ProspeoClient:
         self.logger.debug(f"Extracted {len(people)} people from response. Total collected: {self._total_people_collected}")
         return people
         
-    def get_pagination(self, response):
+    # Response helpers read only the response, so search threads can call them without
+    # touching client state
+    @staticmethod
+    def get_pagination(response):
         return response.get("pagination", {})
     
-    def is_error(self, response):
+    @staticmethod
+    def is_error(response):
         return response.get("error", False) or response.get("_http_status", 200) >= 400
     
-    def get_error_code(self, response):
+    @staticmethod
+    def get_error_code(response):
         return response.get("error_code", "UNKNOWN_ERROR")
     
     def get_tracking_stats(self):
@@ -241,9 +340,12 @@ class ProspeoClient:
                 actual_per_second = int(headers['x-second-rate-limit'])
                 # Validate rate limit is reasonable (1-1000 requests/second)
                 if 1 <= actual_per_second <= 1000:
-                    if actual_per_second != self._current_per_second:
-                        self._current_per_second = actual_per_second
-                        self.min_interval = 1.0 / actual_per_second
+                    with self._rate_update_lock:
+                        changed = actual_per_second != self._current_per_second
+                        if changed:
+                            self._current_per_second = actual_per_second
+                            self.min_interval = 1.0 / actual_per_second
+                    if changed:
                         self.logger.info(f"Updated rate limit: {actual_per_second}/second")
                 else:
                     self.logger.warning(f"Ignoring invalid rate limit from headers: {actual_per_second}")
@@ -1,3 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
 EMPLOYEE_RANGES = [
     "1-10", "11-20", "21-50", "51-100", "101-200", 
     "201-500", "501-1000", "1001-2000", "2001-5000", 
@@ -24,6 +27,16 @@ class QuerySegmenter:
         pagination = self.client.get_pagination(response)
         return pagination["total_count"], response
 
+    def estimate_total_counts(self, filters_list):
+        """Estimate several filter sets concurrently; results are returned in input order."""
+        if not filters_list:
+            return []
+        
+        # Requests still pass through the client's shared rate limiter
+        max_workers = min(Config.PROSPEO_MAX_CONCURRENT_REQUESTS, len(filters_list))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.estimate_total_count, filters_list))
+
     def needs_segmentation(self, total_count):
         return total_count > MAX_RESULTS_PER_QUERY
     
@@ -68,6 +81,11 @@ class QuerySegmenter:
         return segments
 
     def create_execution_plan(self, base_filters):
+        """Split base_filters into segments under MAX_RESULTS_PER_QUERY and estimate each one.
+        
+        Each segment carries the page-1 response its count came from as "first_page", so the
+        job can use it instead of requesting that page again.
+        """
         total_count, initial_response = self.estimate_total_count(base_filters)
         
         if self.client.is_error(initial_response):
@@ -86,7 +104,8 @@ class QuerySegmenter:
                 "segments": [{
                     "filters": base_filters,
                     "estimated_count": total_count,
-                    "pages": pages_needed
+                    "pages": pages_needed,
+                    "first_page": initial_response
                 }],
                 "total_estimated": total_count,
                 "credits_estimate": pages_needed
@@ -97,19 +116,28 @@ class QuerySegmenter:
         total_pages = 0
         total_estimated = 0
         
-        for segment_filters in segments:
-            count, _ = self.estimate_total_count(segment_filters)
+        # Segment counts are independent, so each level is estimated in one concurrent wave
+        estimates = self.estimate_total_counts(segments)
+        sub_segments_list = [
+            self.generate_segments(segment_filters, count) if count > MAX_RESULTS_PER_QUERY else []
+            for segment_filters, (count, _) in zip(segments, estimates)
+        ]
+        sub_estimates = iter(self.estimate_total_counts(
+            [sub_filter for sub_segments in sub_segments_list for sub_filter in sub_segments]
+        ))
+        
+        for segment_filters, (count, response), sub_segments in zip(segments, estimates, sub_segments_list):
             pages = (count + 24) // 25
             
             if count > MAX_RESULTS_PER_QUERY:
-                sub_segments = self.generate_segments(segment_filters, count)
                 for sub_filter in sub_segments:
-                    sub_count, _ = self.estimate_total_count(sub_filter)
+                    sub_count, sub_response = next(sub_estimates)
                     sub_pages = (sub_count + 24) // 25
                     segment_details.append({
                         "filters": sub_filter,
                         "estimated_count": sub_count,
-                        "pages": sub_pages
+                        "pages": sub_pages,
+                        "first_page": sub_response
                     })
                     total_pages += sub_pages
                     total_estimated += sub_count
@@ -117,7 +145,8 @@ class QuerySegmenter:
                 segment_details.append({
                     "filters": segment_filters,
                     "estimated_count": count,
-                    "pages": pages
+                    "pages": pages,
+                    "first_page": response
                 })
                 total_pages += pages
                 total_estimated += count
@@ -233,10 +233,30 @@ class HubSpotCacheSync:
         return count
     
     def add_to_cache(self, companies):
-        """Add or update companies in cache."""
+        """Add or update companies in cache.
+        
+        The batch's existing rows are loaded in one query, and only fields whose value changed
+        are assigned, so an unchanged company only has last_synced updated.
+        """
         if not companies:
             return 0
         
+        # Helper function to parse integer safely
+        def parse_int(value):
+            if value is None or value == "":
+                return None
+            try:
+                return int(float(str(value)))
+            except (ValueError, TypeError):
+                return None
+        
+        existing_by_id = {
+            entry.hubspot_object_id: entry
+            for entry in self.session.query(HubSpotCache).filter(
+                HubSpotCache.hubspot_object_id.in_({str(company["id"]) for company in companies})
+            )
+        }
+        
         count = 0
         for company in companies:
             properties = company.get("properties", {})
@@ -256,56 +276,39 @@ class HubSpotCacheSync:
                     except (ValueError, TypeError) as e:
                         logger.warning(f"Could not parse createdate '{raw_date}' for company {company.get('id')}: {e}")
             
-            # Check if exists
-            existing = self.session.query(HubSpotCache).filter_by(
-                hubspot_object_id=str(company["id"])
-            ).first()
-            
-            # Helper function to parse integer safely
-            def parse_int(value):
-                if value is None or value == "":
-                    return None
-                try:
-                    return int(float(str(value)))
-                except (ValueError, TypeError):
-                    return None
+            values = {
+                "domain": properties.get("domain"),
+                "hs_additional_domains": properties.get("hs_additional_domains"),
+                "linkedin_handle": properties.get("hs_linkedin_handle"),
+                "vertical": properties.get("vertical"),
+                "company_name": properties.get("name"),
+                "hubspot_created_date": created_date,
+                # SDR count fields
+                "aip_sdrs": parse_int(properties.get("aip___of_sdrs")),
+                "override_sdrs": parse_int(properties.get("manual_override_____sdrs")),
+                "mixrank_sdrs": parse_int(properties.get("mixrank_____sdrs")),
+                "keyplay_sdrs": parse_int(properties.get("keyplay___sdrs_bdrs")),
+                "clay_sdrs": parse_int(properties.get("clay_estimated___sdrs")),
+                "final_sdrs": parse_int(properties.get("estimated___sdrs")),
+            }
             
+            hubspot_object_id = str(company["id"])
+            existing = existing_by_id.get(hubspot_object_id)
             if existing:
                 # Update existing
-                existing.domain = properties.get("domain")
-                existing.hs_additional_domains = properties.get("hs_additional_domains")
-                existing.linkedin_handle = properties.get("hs_linkedin_handle")
-                existing.vertical = properties.get("vertical")
-                existing.company_name = properties.get("name")
-                existing.hubspot_created_date = created_date
-                # Update SDR count fields
-                existing.aip_sdrs = parse_int(properties.get("aip___of_sdrs"))
-                existing.override_sdrs = parse_int(properties.get("manual_override_____sdrs"))
-                existing.mixrank_sdrs = parse_int(properties.get("mixrank_____sdrs"))
-                existing.keyplay_sdrs = parse_int(properties.get("keyplay___sdrs_bdrs"))
-                existing.clay_sdrs = parse_int(properties.get("clay_estimated___sdrs"))
-                existing.final_sdrs = parse_int(properties.get("estimated___sdrs"))
+                for name, value in values.items():
+                    if getattr(existing, name) != value:
+                        setattr(existing, name, value)
                 existing.last_synced = datetime.now(UTC)
             else:
-                # Create new
+                # Create new; remembered in case the batch repeats the company
                 new_cache_entry = HubSpotCache(
-                    hubspot_object_id=str(company["id"]),
-                    domain=properties.get("domain"),
-                    hs_additional_domains=properties.get("hs_additional_domains"),
-                    linkedin_handle=properties.get("hs_linkedin_handle"),
-                    vertical=properties.get("vertical"),
-                    company_name=properties.get("name"),
-                    hubspot_created_date=created_date,
-                    # Add SDR count fields
-                    aip_sdrs=parse_int(properties.get("aip___of_sdrs")),
-                    override_sdrs=parse_int(properties.get("manual_override_____sdrs")),
-                    mixrank_sdrs=parse_int(properties.get("mixrank_____sdrs")),
-                    keyplay_sdrs=parse_int(properties.get("keyplay___sdrs_bdrs")),
-                    clay_sdrs=parse_int(properties.get("clay_estimated___sdrs")),
-                    final_sdrs=parse_int(properties.get("estimated___sdrs")),
-                    last_synced=datetime.now(UTC)
+                    hubspot_object_id=hubspot_object_id,
+                    last_synced=datetime.now(UTC),
+                    **values
                 )
                 self.session.add(new_cache_entry)
+                existing_by_id[hubspot_object_id] = new_cache_entry
             
             count += 1
         